@@ -0,0 +1,180 @@
+"""Local stand-in for the parts of Discord's REST API the bot uses.
+
+Answers login and command sync, creates messages and executes webhooks with
+a configurable latency, and enforces Discord-like rate limits: 5 messages
+per 5 seconds per channel, 5 executions per 2 seconds per webhook and an
+optional global requests-per-second cap for bot-token requests, answering
+429 with retry_after and a Via header like Discord does, so discord.py
+waits and retries them itself as it does in production (it treats a 429
+without Via as a Cloudflare block and raises it). A fraction of requests can
+also be rejected with a random 429 to exercise retries.
+
+There is no gateway: the bot logs in over REST only, so the guild cache,
+on_ready and the reminder task are not exercised.
+
+    python -m benchmarks.fake_discord --port 8081 --latency 0.05
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+from collections import defaultdict, deque
+
+from aiohttp import web
+
+from benchmarks.synthetic import BOT_USER_ID, user
+
+EVENT_IMAGE = re.compile(r"/pepito/(\d+)\.jpg")
+
+
+def json_response(data, status=200, headers=None):
+    # discord.py only decodes bodies whose content type is exactly application/json
+    return web.Response(body=json.dumps(data).encode(), status=status, headers=headers, content_type="application/json")
+
+
+class FakeDiscord:
+    def __init__(self, latency=0.0, error_rate=0.0, global_rate=None, channel_rate=5, channel_per=5.0,
+                 host="127.0.0.1", port=0):
+        self.latency = latency  # Seconds added to every response
+        self.error_rate = error_rate  # Fraction of sends answered with a random 429
+        self.global_rate = global_rate  # Requests per second before a global 429, None for unlimited
+        self.channel_rate = channel_rate
+        self.channel_per = channel_per
+        self.host = host
+        self.port = port
+        self.ids = itertools.count(10 ** 17)
+        self.messages = 0
+        self.rate_limited = 0
+        self.deliveries = defaultdict(list)  # Pépito event index -> time.monotonic() of each delivery
+        self.channel_sends = defaultdict(deque)
+        self.global_sends = deque()
+        self.runner = None
+
+    @property
+    def api_base(self):
+        return f"http://{self.host}:{self.port}/api/v10"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/api/v10/users/@me", self.get_user)
+        app.router.add_get("/api/v10/oauth2/applications/@me", self.get_application)
+        app.router.add_put("/api/v10/applications/{application_id}/commands", self.sync_commands)
+        app.router.add_post("/api/v10/channels/{channel_id}/messages", self.create_message)
+        app.router.add_post("/api/v10/webhooks/{webhook_id}/{token}", self.execute_webhook)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    async def get_user(self, request):
+        return json_response({**user(BOT_USER_ID), "bot": True, "mfa_enabled": False, "verified": True, "flags": 0})
+
+    async def get_application(self, request):
+        return json_response({
+            "id": str(BOT_USER_ID), "name": "Pépito", "description": "", "icon": None, "bot_public": True,
+            "bot_require_code_grant": False, "owner": user(1), "verify_key": "0" * 64, "flags": 0,
+        })
+
+    async def sync_commands(self, request):
+        commands = await request.json()
+        application_id = request.match_info["application_id"]
+        return json_response([
+            {**command, "id": str(next(self.ids)), "application_id": application_id, "version": "1"}
+            for command in commands
+        ])
+
+    def _rate_limit(self, key, rate, per, bot_token=True):
+        """Return a 429 response if this request is over a limit, else None."""
+        now = time.monotonic()
+        # Webhook executions don't count against the bot's global limit
+        if bot_token and self.global_rate is not None:
+            sends = self.global_sends
+            while sends and now - sends[0] >= 1:
+                sends.popleft()
+            if len(sends) >= self.global_rate:
+                return self._too_many(1 - (now - sends[0]), is_global=True)
+            sends.append(now)
+
+        sends = self.channel_sends[key]
+        while sends and now - sends[0] >= per:
+            sends.popleft()
+        if len(sends) >= rate:
+            return self._too_many(per - (now - sends[0]))
+        if self.error_rate and random.random() < self.error_rate:
+            return self._too_many(0.1)
+        sends.append(now)
+        return None
+
+    def _too_many(self, retry_after, is_global=False):
+        self.rate_limited += 1
+        headers = {
+            "Retry-After": str(retry_after),
+            "X-RateLimit-Scope": "global" if is_global else "user",
+            "Via": "1.1 google",  # Discord's 429s come through its proxy
+        }
+        if is_global:
+            headers["X-RateLimit-Global"] = "true"
+        return json_response(
+            {"message": "You are being rate limited.", "retry_after": retry_after, "global": is_global},
+            status=429, headers=headers,
+        )
+
+    async def _record(self, request):
+        """Count a delivered message and return its body."""
+        body = await request.json()
+        self.messages += 1
+        for embed in body.get("embeds") or ():
+            match = EVENT_IMAGE.search((embed.get("image") or {}).get("url", ""))
+            if match:
+                self.deliveries[int(match.group(1))].append(time.monotonic())
+        return body
+
+    async def create_message(self, request):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        channel_id = request.match_info["channel_id"]
+        limited = self._rate_limit(channel_id, self.channel_rate, self.channel_per)
+        if limited is not None:
+            return limited
+        body = await self._record(request)
+        return json_response({"id": str(next(self.ids)), "channel_id": channel_id, **body})
+
+    async def execute_webhook(self, request):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        # Webhooks have their own bucket of 5 requests every 2 seconds
+        limited = self._rate_limit(f"webhook:{request.match_info['webhook_id']}", 5, 2.0, bot_token=False)
+        if limited is not None:
+            return limited
+        await self._record(request)
+        return web.Response(status=204)
+
+
+async def serve(args):
+    server = FakeDiscord(latency=args.latency, error_rate=args.error_rate, global_rate=args.global_rate,
+                         host=args.host, port=args.port)
+    await server.start()
+    print(f"Serving fake Discord API on {server.api_base}")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of sends answered with 429")
+    parser.add_argument("--global-rate", type=int, default=None, help="requests per second before a global 429")
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
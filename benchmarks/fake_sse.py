@@ -0,0 +1,126 @@
+"""Local stand-in for the Pépito SSE API.
+
+Serves a text/event-stream of numbered events in the same shape as the
+real API, honours Last-Event-ID by replaying everything after that id,
+can interleave heartbeats, can lag behind by a fixed delay like a slow
+mirror, and can stall: keep the connection open without sending anything,
+like a half-open TCP connection.
+
+    python -m benchmarks.fake_sse --port 8080 --interval 1
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from aiohttp import web
+
+
+def pepito_event(index):
+    return {
+        "event": "pepito",
+        "type": "in" if index % 2 else "out",
+        "time": 1700000000 + index,
+        "img": f"https://example.invalid/pepito/{index}.jpg",
+    }
+
+
+def encode(index, event):
+    return f"id: {index}\ndata: {json.dumps(event)}\n\n".encode("utf-8")
+
+
+class FakeSSEServer:
+    """Serve `events` pepito events, `interval` seconds apart (0 streams them as fast as possible)."""
+
+    def __init__(self, events=None, interval=1.0, heartbeat=0, batch=1, stall_after=None, delay=0.0,
+                 host="127.0.0.1", port=0):
+        self.events = events  # None streams forever
+        self.interval = interval
+        self.heartbeat = heartbeat  # Send a heartbeat every `heartbeat` events, 0 disables
+        self.batch = batch  # Events written per network write
+        self.stall_after = stall_after  # Go silent after this many events on each connection
+        self.delay = delay  # Seconds every event is held back, like a mirror trailing the origin
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self.emitted = {}  # Event index -> time.monotonic() it was written to a client
+        self.runner = None
+        self.stopping = asyncio.Event()  # Releases stalled connections so stop() doesn't wait on them
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/sse/v1/events"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/sse/v1/events", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.stopping.set()
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    async def handle(self, request):
+        self.connections += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b"retry: 1000\n\n")
+
+        try:
+            index = int(request.headers.get("Last-Event-ID", 0)) + 1
+            sent = 0
+            pending = []
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            while self.events is None or index <= self.events:
+                if self.stall_after is not None and sent == self.stall_after:
+                    await self.stopping.wait()  # Silent until the server stops, whether or not the client left
+                    return response
+                sent += 1
+                pending.append(encode(index, pepito_event(index)))
+                if self.heartbeat and index % self.heartbeat == 0:
+                    pending.append(f"data: {json.dumps({'event': 'heartbeat', 'time': int(time.time())})}\n\n".encode())
+                index += 1
+                if len(pending) >= self.batch:
+                    await response.write(b"".join(pending))
+                    pending.clear()
+                    self.emitted.setdefault(index - 1, time.monotonic())
+                    if self.interval:
+                        await asyncio.sleep(self.interval)
+            if pending:
+                await response.write(b"".join(pending))
+                self.emitted.setdefault(index - 1, time.monotonic())
+        except ConnectionResetError:
+            pass  # The client went away
+        return response
+
+
+async def serve(args):
+    server = FakeSSEServer(
+        events=args.events, interval=args.interval, heartbeat=args.heartbeat, stall_after=args.stall_after,
+        delay=args.delay, host=args.host, port=args.port,
+    )
+    await server.start()
+    print(f"Serving fake Pépito events on {server.url}")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--events", type=int, default=None, help="stop after this many events")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between events")
+    parser.add_argument("--heartbeat", type=int, default=5, help="heartbeat every N events, 0 disables")
+    parser.add_argument("--stall-after", type=int, default=None, help="go silent after N events on each connection")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds every event is held back")
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
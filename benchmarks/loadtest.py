@@ -0,0 +1,159 @@
+"""Offline load test of the real cogs against local stand-ins for Discord and the Pépito API.
+
+For each guild count, starts benchmarks.fake_discord and benchmarks.fake_sse,
+then runs the bot (bot.create_bot, the real cogs, delivery queue and
+sender) in a child process logged in to the fake Discord, with every guild
+subscribed. The fake SSE server emits a burst of events and the run ends
+once every event reached every channel.
+
+Reports delivery throughput, time from an event leaving the SSE server to
+its last delivery (measured by the stand-ins), and the bot process's CPU
+time and peak memory.
+
+Only REST delivery is measured: the fake Discord has no gateway, so the
+guild cache, on_ready and the reminder task don't run.
+
+    python -m benchmarks.loadtest --guilds 100 1000 10000 --events 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_discord import FakeDiscord
+from benchmarks.fake_sse import FakeSSEServer
+from benchmarks.synthetic import guild_ids
+
+
+async def run_bot(config):
+    """Child process: run the bot until every event was delivered, then print the results as JSON."""
+    os.chdir(tempfile.mkdtemp(prefix="pepito-loadtest-"))
+    with open("channels.json", "w", encoding="utf-8") as f:
+        json.dump({
+            str(guild_id): {
+                "server_name": f"Guild {guild_id}", "channel_id": str(guild_id * 100),
+                # With --webhooks every channel has a webhook, as /setchannel creates with DELIVERY_MODE=webhook
+                **({"webhook_id": str(guild_id * 100 + 1), "webhook_token": "token"} if config["webhooks"] else {}),
+            }
+            for guild_id in guild_ids(config["guilds"])
+        }, f)
+    os.environ.update({
+        "API_URL": config["sse_url"],
+        "DEVELOPER_SERVER_ID": "1",
+        "METRICS_PORT": "0",
+        "FANOUT_CONCURRENCY": str(config["concurrency"]),
+        "FANOUT_GLOBAL_RATE": str(config["global_rate"]),
+        "WEBHOOK_CONCURRENCY": str(config["concurrency"]),
+        "DELIVERY_MODE": "webhook" if config["webhooks"] else "bot",
+    })
+
+    import discord
+    import bot as bot_module
+
+    discord.http.Route.BASE = config["api_base"]
+    bot = bot_module.create_bot()
+    start = time.perf_counter()
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    await bot.login("fake-token")  # Runs setup_hook, which starts the queue and loads the cogs
+
+    deadline = time.monotonic() + config["timeout"]
+    latency = bot.delivery.latency
+    while len(latency.samples) < config["events"] or bot.delivery.batches:
+        if time.monotonic() > deadline:
+            break
+        await asyncio.sleep(0.05)
+
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+    result = {
+        "wall": time.perf_counter() - start,
+        "cpu": (usage_end.ru_utime - usage_start.ru_utime) + (usage_end.ru_stime - usage_start.ru_stime),
+        "max_rss_mib": usage_end.ru_maxrss / 1024,
+        "batches": len(latency.samples),
+        "p50": latency.percentile(50),
+        "p99": latency.percentile(99),
+    }
+    await bot.close()
+    print(json.dumps(result))
+
+
+async def run_size(guilds, args):
+    """Parent process: run the stand-ins and one bot process for `guilds` guilds."""
+    discord_server = FakeDiscord(latency=args.latency, error_rate=args.error_rate, global_rate=args.discord_global_rate)
+    sse_server = FakeSSEServer(events=args.events, interval=args.interval, heartbeat=0)
+    await discord_server.start()
+    await sse_server.start()
+    try:
+        config = {
+            "guilds": guilds, "events": args.events, "timeout": args.timeout,
+            "api_base": discord_server.api_base, "sse_url": sse_server.url,
+            "concurrency": args.concurrency, "global_rate": args.global_rate, "webhooks": args.webhooks,
+        }
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "benchmarks.loadtest", "--child", json.dumps(config),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await process.communicate()
+        if process.returncode:
+            raise RuntimeError(f"bot process failed:\n{stderr.decode()[-2000:]}")
+        result = json.loads(stdout.decode().strip().splitlines()[-1])
+    finally:
+        await sse_server.stop()
+        await discord_server.stop()
+
+    to_last = [
+        max(times) - sse_server.emitted[index]
+        for index, times in discord_server.deliveries.items()
+        if index in sse_server.emitted
+    ]
+    last = max((max(times) for times in discord_server.deliveries.values()), default=None)
+    span = last - min(sse_server.emitted.values()) if last is not None and sse_server.emitted else None
+    complete = sum(1 for times in discord_server.deliveries.values() if len(times) >= guilds)
+    result.update({
+        "guilds": guilds,
+        "messages": discord_server.messages,
+        "rate_limited": discord_server.rate_limited,
+        "complete_events": complete,
+        "to_last_max": max(to_last) if to_last else None,
+        "throughput": discord_server.messages / span if span else 0,
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--events", type=int, default=3, help="events in the SSE burst")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between events")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake Discord response time in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of sends answered with a random 429")
+    parser.add_argument("--discord-global-rate", type=int, default=None,
+                        help="requests per second the fake Discord accepts before a global 429")
+    parser.add_argument("--concurrency", type=int, default=25, help="FANOUT_CONCURRENCY for the bot")
+    parser.add_argument("--global-rate", type=int, default=100000,
+                        help="FANOUT_GLOBAL_RATE for the bot, 45 matches production")
+    parser.add_argument("--webhooks", action="store_true", help="deliver through channel webhooks (DELIVERY_MODE=webhook)")
+    parser.add_argument("--timeout", type=float, default=600, help="give up on a run after this many seconds")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(run_bot(json.loads(args.child)))
+        return
+
+    print(f"{'guilds':>7} {'messages':>9} {'msg/s':>8} {'to last (s)':>12} {'p99 (s)':>8} {'429s':>6} {'CPU (s)':>8} {'RSS MiB':>8}")
+    for guilds in args.guilds:
+        result = asyncio.run(run_size(guilds, args))
+        if result["complete_events"] < args.events:
+            print(f"warning: only {result['complete_events']}/{args.events} events reached every guild")
+        print(
+            f"{result['guilds']:>7} {result['messages']:>9} {result['throughput']:>8.0f} {result['to_last_max'] or 0:>12.2f} "
+            f"{result['p99'] or 0:>8.2f} {result['rate_limited']:>6} {result['cpu']:>8.2f} {result['max_rss_mib']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
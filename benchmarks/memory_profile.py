@@ -0,0 +1,75 @@
+"""Compare the resident memory of the "full" and "lean" startup profiles.
+
+Each profile runs in a fresh subprocess that fills discord.py's cache with
+synthetic guilds shaped like the GUILD_CREATE payloads Discord would send
+for that profile's intents (members and presences only arrive with the
+full profile), then reports its resident set size.
+
+    python -m benchmarks.memory_profile --guilds 1000 10000 --members 100
+"""
+import argparse
+import gc
+import subprocess
+import sys
+
+import discord
+
+from benchmarks.synthetic import BOT_USER_ID, guild_ids, guild_payload, user
+from utils.profile import client_options
+
+
+def rss_mib():
+    """Return the current resident set size in MiB (Linux only)."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError("VmRSS not available")
+
+
+def measure(profile, guilds, members):
+    options = client_options(profile)
+    client = discord.Client(**options)
+    state = client._connection
+    state.user = discord.ClientUser(state=state, data={**user(BOT_USER_ID), "bot": True, "mfa_enabled": False, "verified": True})
+    intents = options["intents"]
+
+    gc.collect()
+    baseline = rss_mib()
+    for guild_id in guild_ids(guilds):
+        data = guild_payload(
+            guild_id,
+            members=members if intents.members else 0,
+            presences=intents.presences,
+        )
+        state._add_guild_from_data(data)
+    gc.collect()
+    cached_members = sum(len(guild._members) for guild in state._guilds.values())
+    print(f"{profile},{guilds},{cached_members},{rss_mib() - baseline:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--members", type=int, default=100, help="members per guild sent with the full profile")
+    parser.add_argument("--child", nargs=2, metavar=("PROFILE", "GUILDS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure(args.child[0], int(args.child[1]), args.members)
+        return
+
+    print(f"{'profile':<8} {'guilds':>7} {'members':>9} {'RSS MiB':>9}")
+    for guilds in args.guilds:
+        for profile in ("full", "lean"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.memory_profile", "--members", str(args.members),
+                 "--child", profile, str(guilds)],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            profile, guilds_, cached, rss = output.split(",")
+            print(f"{profile:<8} {guilds_:>7} {cached:>9} {rss:>9}")
+
+
+if __name__ == "__main__":
+    main()
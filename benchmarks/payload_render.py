@@ -0,0 +1,93 @@
+"""Compare building an embed per channel with sending one prebuilt payload.
+
+"per channel" is what channel.send(embed=...) does for every recipient:
+build the Embed and turn it into request parameters. "prebuilt" renders
+once with utils.payloads and reuses the result; for reminders, the cached
+template only fills in the owner mention per guild.
+
+    python -m benchmarks.payload_render --channels 10000
+"""
+import argparse
+import time
+import tracemalloc
+
+import discord
+from discord.http import handle_message_parameters
+
+from utils.payloads import EmbedTemplate, embed_payload
+
+
+def event_embed():
+    embed = discord.Embed(title="Pépito is back home! (12:34:56)", color=discord.Color.blue())
+    embed.set_image(url="https://example.invalid/pepito/1.jpg")
+    embed.set_footer(text="Pépito Notification System")
+    return embed
+
+
+def reminder_embed(owner_id):
+    embed = discord.Embed(
+        title="Pépito Reminder",
+        description=(
+            f"Hello <@{owner_id}>, it seems you haven't set a notification channel for Pépito yet! "
+            "Please use the `/setchannel` command to configure one."
+        ),
+        color=discord.Color.orange(),
+    )
+    embed.set_footer(text="Pépito Notification System")
+    return embed
+
+
+def event_per_channel(channels):
+    for _ in range(channels):
+        with handle_message_parameters(embed=event_embed()) as params:
+            params.payload
+
+
+def event_prebuilt(channels):
+    params = embed_payload(event_embed())
+    for _ in range(channels):
+        params.payload
+
+
+def reminder_per_guild(guilds):
+    for owner_id in range(guilds):
+        with handle_message_parameters(embed=reminder_embed(owner_id)) as params:
+            params.payload
+
+
+def reminder_template(guilds):
+    template = EmbedTemplate(reminder_embed("{owner_id}"))
+    for owner_id in range(guilds):
+        template.render(owner_id=owner_id).payload
+
+
+def measure(function, count):
+    start = time.perf_counter()
+    function(count)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    function(count)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'case':<20} {'total ms':>9} {'us/channel':>11} {'peak KiB':>9}")
+    for name, function in (
+        ("event per channel", event_per_channel),
+        ("event prebuilt", event_prebuilt),
+        ("reminder per guild", reminder_per_guild),
+        ("reminder template", reminder_template),
+    ):
+        elapsed, peak = measure(function, args.channels)
+        print(f"{name:<20} {elapsed * 1000:>9.1f} {elapsed / args.channels * 1e6:>11.2f} {peak / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Compare reading one Pépito API endpoint with reading several mirrors at once.
+
+Starts three local stand-ins for the API: a fast one that stalls after a
+few events (an outage), a mirror trailing it slightly, and a slow mirror.
+Reads each alone with SSEClient, then all three together with
+MultiSourceSSE, and reports how long the events took to arrive, the largest
+gap between two events, and per-source statistics (events delivered first,
+median delay behind the fastest source, demotion).
+
+    python -m benchmarks.sse_redundancy --events 40 --interval 0.1
+"""
+import argparse
+import asyncio
+import contextlib
+import time
+
+import aiohttp
+
+from benchmarks.fake_sse import FakeSSEServer
+from utils.sse import MultiSourceSSE, SSEClient
+
+SOURCES = [
+    # name, delay, stall_after
+    ("fast, stalls", 0.0, 10),
+    ("mirror", 0.2, None),
+    ("slow mirror", 1.5, None),
+]
+
+
+async def receive(stream, count):
+    """Return (total seconds, largest gap) to receive `count` events from an event generator."""
+    start = last = time.perf_counter()
+    largest = 0.0
+    received = 0
+    # Closing the generator disconnects, so the stand-ins can stop right away
+    async with contextlib.aclosing(stream):
+        async for _ in stream:
+            now = time.perf_counter()
+            largest = max(largest, now - last)
+            last = now
+            received += 1
+            if received == count:
+                break
+    return last - start, largest
+
+
+async def run(args):
+    results = []
+    async with aiohttp.ClientSession() as session:
+        for name, delay, stall_after in SOURCES:
+            server = FakeSSEServer(events=args.events, interval=args.interval, stall_after=stall_after, delay=delay)
+            await server.start()
+            try:
+                client = SSEClient(session, server.url, read_timeout=args.read_timeout)
+                results.append((name, *await receive(client.events(), args.events), None))
+            finally:
+                await server.stop()
+
+        servers = [
+            FakeSSEServer(events=args.events, interval=args.interval, stall_after=stall_after, delay=delay)
+            for _, delay, stall_after in SOURCES
+        ]
+        for server in servers:
+            await server.start()
+        try:
+            stream = MultiSourceSSE(
+                session, [server.url for server in servers], read_timeout=args.read_timeout,
+                demote_lag=args.demote_lag, demote_after=5,
+            )
+            total, gap = await receive(stream.events(), args.events)
+            results.append(("all three merged", total, gap, stream.health()["sources"]))
+        finally:
+            for server in servers:
+                await server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=40)
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between events")
+    parser.add_argument("--read-timeout", type=float, default=3.0, help="seconds of silence before reconnecting")
+    parser.add_argument("--demote-lag", type=float, default=1.0, help="median delay that demotes a source")
+    args = parser.parse_args()
+
+    print(f"{'source':<18} {'total (s)':>9} {'largest gap (s)':>15}")
+    for name, total, gap, sources in asyncio.run(run(args)):
+        print(f"{name:<18} {total:>9.2f} {gap:>15.2f}")
+        for (source_name, _, _), source in zip(SOURCES, sources or ()):
+            lag = source["lag_p50"] or 0
+            print(f"  {source_name:<16} first {source['first']:>3}, median delay {lag:.2f}s"
+                  f"{', demoted' if source['demoted'] else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Measure how many events per second the SSE decoder parses from a local stream.
+
+Streams events from benchmarks.fake_sse as fast as possible and parses
+them the way APIConnectionCog does (decode the stream, then one json.loads
+per event).
+
+    python -m benchmarks.sse_throughput --events 200000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+
+from benchmarks.fake_sse import FakeSSEServer
+from utils.sse import SSEDecoder
+
+
+async def run(events, batch):
+    server = FakeSSEServer(events=events, interval=0, batch=batch)
+    await server.start()
+    try:
+        decoder = SSEDecoder()
+        received = 0
+        async with aiohttp.ClientSession() as session:
+            start = time.perf_counter()
+            async with session.get(server.url) as response:
+                async for chunk in response.content.iter_any():
+                    for sse_event in decoder.feed(chunk):
+                        json.loads(sse_event.data)
+                        received += 1
+            elapsed = time.perf_counter() - start
+    finally:
+        await server.stop()
+    return received, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=100, help="events per server write")
+    args = parser.parse_args()
+
+    received, elapsed = asyncio.run(run(args.events, args.batch))
+    print(f"Parsed {received} events in {elapsed:.2f}s ({received / elapsed:,.0f} events/s)")
+
+
+if __name__ == "__main__":
+    main()
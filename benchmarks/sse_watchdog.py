@@ -0,0 +1,53 @@
+"""Measure how long a stalled SSE connection delays notifications.
+
+Runs SSEClient against a local stand-in that goes silent after a few
+events on every connection and reports the largest gap between two
+consecutive events, which is bounded by the watchdog's read timeout plus
+the reconnect backoff.
+
+    python -m benchmarks.sse_watchdog --read-timeout 2 --events 10
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from benchmarks.fake_sse import FakeSSEServer
+from utils.sse import SSEClient
+
+
+async def run(args):
+    server = FakeSSEServer(interval=args.interval, stall_after=args.stall_after)
+    await server.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            client = SSEClient(session, server.url, read_timeout=args.read_timeout)
+            gaps = []
+            last = time.perf_counter()
+            async for event in client.events():
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+                if len(gaps) == args.events:
+                    break
+            return gaps, client.watchdog.health()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--read-timeout", type=float, default=2.0)
+    parser.add_argument("--stall-after", type=int, default=3, help="events per connection before the server stalls")
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between events")
+    parser.add_argument("--events", type=int, default=10)
+    args = parser.parse_args()
+
+    gaps, health = asyncio.run(run(args))
+    print(f"Received {len(gaps)} events, largest gap {max(gaps):.2f}s (read timeout {args.read_timeout}s)")
+    print(f"Connection health: {health}")
+
+
+if __name__ == "__main__":
+    main()
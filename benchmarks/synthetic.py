@@ -0,0 +1,73 @@
+"""Synthetic Discord payloads for the offline benchmarks."""
+
+BOT_USER_ID = 1000
+
+
+def user(user_id):
+    return {
+        "id": str(user_id),
+        "username": f"user{user_id}",
+        "discriminator": "0",
+        "global_name": None,
+        "avatar": None,
+    }
+
+
+def guild_payload(guild_id, channels=10, members=0, presences=False):
+    """Build a GUILD_CREATE payload with `channels` text channels and `members` members.
+
+    The bot's own member is always included, like Discord does regardless of intents.
+    """
+    channel_list = [
+        {
+            "id": str(guild_id * 100 + index),
+            "type": 0,
+            "guild_id": str(guild_id),
+            "name": f"channel-{index}",
+            "position": index,
+            "permission_overwrites": [],
+            "nsfw": False,
+            "parent_id": None,
+        }
+        for index in range(channels)
+    ]
+    member_ids = [BOT_USER_ID] + [guild_id * 100000 + index for index in range(members)]
+    member_list = [
+        {"user": user(member_id), "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False,
+         "flags": 0}
+        for member_id in member_ids
+    ]
+    presence_list = []
+    if presences:
+        presence_list = [
+            {
+                "user": {"id": str(member_id)},
+                "status": "online",
+                "activities": [{"name": "Watching Pépito", "type": 3}],
+                "client_status": {"desktop": "online"},
+            }
+            for member_id in member_ids
+        ]
+    return {
+        "id": str(guild_id),
+        "name": f"Guild {guild_id}",
+        "icon": None,
+        "owner_id": str(member_ids[-1]),
+        "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": "104324673", "position": 0,
+                   "color": 0, "hoist": False, "managed": False, "mentionable": False}],
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+        "channels": channel_list,
+        "members": member_list,
+        "presences": presence_list,
+        "threads": [],
+        "member_count": len(member_ids),
+        "large": len(member_ids) > 250,
+        "unavailable": False,
+    }
+
+
+def guild_ids(count, start=1):
+    """Return `count` guild ids spread over the snowflake range like real ones."""
+    return [(start + index) << 22 | index for index in range(count)]
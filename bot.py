@@ -1,48 +1,178 @@
 import discord
+import logging
 from discord.ext import commands
 from discord import app_commands
 import os
 from dotenv import load_dotenv
+from utils.command_sync import sync_commands
+from utils.delivery import FanoutSender, WebhookSender
+from utils.delivery_queue import DeliveryQueue
+from utils.history import EventHistory
+from utils.logs import setup_logging
+from utils.metrics_server import start_metrics_server
+from utils.registry import GuildRegistry
+from utils.profile import client_options
+from utils.sharding import shard_options, shard_path
 
 # Load environment variables from .env file
 load_dotenv()
 TOKEN = os.getenv('DISCORD_TOKEN')
 
-# Initialize the bot
-bot = commands.Bot(command_prefix='!', intents = discord.Intents.all())
+log = logging.getLogger("bot")
 
-# Load cogs
-@bot.event
-async def on_ready():
-    # Set the bot's activity
-    activity = discord.Game(name="/setchannel to get started")
-    await bot.change_presence(activity=activity)
+# Cogs loaded at startup
+COGS = [
+    'cogs.setchannel',      # Set channel cog
+    'cogs.preferences',     # Notification preferences cog
+    'cogs.announce',        # Announcement cog
+    'cogs.api_connection',  # API connection cog
+    'cogs.pepito_events',   # Pepito events cog
+    'cogs.hello',           # Invited cog
+    'cogs.reminder',        # Reminder cog
+    'cogs.history'          # History and statistics cog
+]
 
-    print(f'Logged in as {bot.user} (ID: {bot.user.id})')
-    print('------')
+# Cogs loaded by a delivery worker (see worker.py)
+DELIVERY_COGS = [
+    'cogs.api_connection',  # API connection cog
+    'cogs.pepito_events'    # Pepito events cog
+]
+
+def create_bot(delivery_only=False):
+    """Build the bot and the services shared by its cogs.
+
+    With delivery_only the bot only loads DELIVERY_COGS, leaves the channels
+    database and command sync to the gateway process, and keeps no history.
+    """
+    # Initialize the bot, sharded if SHARD_COUNT, SHARD_IDS or SHARDED is set
+    # BOT_PROFILE picks the gateway intents and caches (see utils/profile.py)
+    options = client_options()
+    # Set the bot's activity when it identifies, so reconnects don't need a presence update
+    options["activity"] = discord.Game(name="/setchannel to get started")
+    sharding = shard_options()
+    if sharding is None:
+        bot = commands.Bot(command_prefix='!', **options)
+    else:
+        bot = commands.AutoShardedBot(command_prefix='!', **options, **sharding)
+    # Shard processes each write their own channels database, compacting a shared one would
+    # drop what the others journaled. A delivery worker only reads the gateway bot's
+    channels_db = os.getenv("CHANNELS_DB")
+    if channels_db is None:
+        if os.getenv("SHARD_IDS") and not delivery_only:
+            raise RuntimeError("SHARD_IDS is set: give each shard process its own CHANNELS_DB.")
+        channels_db = "channels.json"
+    bot.registry = GuildRegistry(
+        channels_db,
+        failure_limit=int(os.getenv("CHANNEL_FAILURE_LIMIT", "3")),
+        read_only=delivery_only,
+    )  # Shared in-memory channels database
+    bot.registry.load()
+    bot.registry.on_disable = lambda guild_id: bot.dispatch("channel_disabled", guild_id)
+
+    # Shared rate-limited sender used by the cogs. With DELIVERY_MODE=webhook, channels
+    # with a webhook (created by /setchannel) get messages through it instead of the bot token
+    bot.webhook_delivery = os.getenv("DELIVERY_MODE", "bot") == "webhook"
+    bot.sender = FanoutSender(bot.http)
+    if bot.webhook_delivery:
+        on_gone = bot.registry.forget_webhook
+        if delivery_only:
+            def on_gone(channel_id):
+                # Stop using it here too until the gateway's change is reloaded
+                bot.registry.forget_webhook(channel_id)
+                relay_to_gateway(bot, {"event": "webhook_gone", "channel_id": channel_id})
+        bot.sender = WebhookSender(bot.sender, bot.registry.webhook_for, on_gone=on_gone)
+
+    # Every Pépito event with daily statistics, for /history and /stats
+    bot.history = None
+    if not delivery_only:
+        bot.history = EventHistory(
+            os.getenv("HISTORY_DB", shard_path("history.bin")),
+            retention_days=int(os.getenv("HISTORY_RETENTION_DAYS", "30")),
+        )
+        bot.history.load()
+    # Persistent queue of pending deliveries, channels that keep failing get disabled.
+    # Each shard process keeps its own journal, a shared one would lose the others' pending batches.
+    # A delivery worker can't write the channels database, it reports results to the gateway process
+    on_result = bot.registry.record_delivery
+    if delivery_only:
+        def on_result(guild_id, channel_id, error):
+            relay_to_gateway(bot, {
+                "event": "delivery_result", "guild_id": str(guild_id), "channel_id": channel_id,
+                "error": None if error is None else str(error),
+            })
+    bot.delivery = DeliveryQueue(
+        bot.sender,
+        path=os.getenv("DELIVERY_QUEUE_DB", shard_path("delivery_queue.journal")),
+        dead_letter_path=os.getenv("DEAD_LETTERS_DB", shard_path("dead_letters.jsonl")),
+        on_result=on_result,
+    )
+
+    # Start everything once, after login and before connecting to the gateway.
+    # on_ready fires again after reconnects, so it must not start anything.
+    async def setup_hook():
+        await start_services(bot, DELIVERY_COGS if delivery_only else COGS)
+        if delivery_only:
+            return
+
+        # Sync commands globally, skipped when the command schema hasn't changed since the last sync
+        try:
+            if await sync_commands(bot, os.getenv("COMMAND_SYNC_CACHE", "command_sync.hash")):
+                log.info("Synced %d commands globally.", len(bot.tree.get_commands()))
+            else:
+                log.info("Commands unchanged since the last sync, skipping sync.")
+        except Exception as e:
+            log.error("Failed to sync commands: %s", e)
+
+    bot.setup_hook = setup_hook
+
+    @bot.event
+    async def on_ready():
+        log.info("Logged in as %s (ID: %s)", bot.user, bot.user.id)
+
+    return bot
+
+def relay_to_gateway(bot, event):
+    """Send an event from a delivery worker back to the gateway process over the event relay."""
+    api = bot.get_cog("APIConnectionCog")
+    if api is None or not api.relay(event):
+        log.warning("Event relay not connected, dropped %s for channel %s.", event["event"], event["channel_id"])
+
+async def start_services(bot, cogs=COGS):
+    """Start the delivery workers and load the cogs."""
+    # Resume deliveries left over from the last run and start the delivery workers
+    await bot.delivery.start()
 
     # Load cogs dynamically
-    cogs = [
-        'cogs.setchannel',      # Set channel cog
-        'cogs.announce',        # Announcement cog
-        'cogs.api_connection',  # API connection cog
-        'cogs.pepito_events',   # Pepito events cog
-        'cogs.hello',           # Invited cog
-        'cogs.reminder'         # Reminder cog
-    ]
     for cog in cogs:
         try:
             await bot.load_extension(cog)
-            print(f'Loaded {cog}')
+            log.info("Loaded %s", cog)
         except Exception as e:
-            print(f'Failed to load {cog}: {e}')
+            log.exception("Failed to load %s: %s", cog, e)
+
+def health(bot):
+    """Describe the bot's state for the /health endpoint."""
+    api = bot.get_cog("APIConnectionCog")
+    sse = api.connection_health() if api else None
+    return {
+        "ok": bot.is_ready() and (sse is None or sse["connected"]),
+        "ready": bot.is_ready(),
+        "gateway_latency": bot.latency if bot.is_ready() else None,
+        "sse": sse,
+        "subscriptions": len(bot.registry.subscriptions),
+        "pending_batches": len(bot.delivery.batches),
+        "queued_deliveries": bot.delivery.queue.qsize(),
+    }
+
+if __name__ == "__main__":
+    # Log records are written by a background thread, see utils/logs.py
+    setup_logging()
+    bot = create_bot()
 
-    # Sync commands globally
-    try:
-        synced = await bot.tree.sync()  # Use bot.tree to sync commands
-        print(f"Synced {len(synced)} commands globally.")
-    except Exception as e:
-        print(f"Failed to sync commands: {e}")
+    # Serve /metrics and /health alongside the bot, METRICS_PORT=0 turns it off
+    metrics_port = int(os.getenv("METRICS_PORT", "8090"))
+    if metrics_port:
+        start_metrics_server(lambda: health(bot), os.getenv("METRICS_HOST", "127.0.0.1"), metrics_port)
 
-# Run the bot
-bot.run(TOKEN)
+    # Run the bot
+    bot.run(TOKEN, log_handler=None)  # discord.py logs through the handler set up above
@@ -1,30 +1,140 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import json
+import asyncio
+import logging
 import os
+import uuid
+from utils import metrics
+from utils.delivery_queue import PRIORITY_ANNOUNCEMENT
+from utils.payloads import embed_payload
+from utils.sharding import owns_guild
+
+log = logging.getLogger(__name__)
 
 class AnnounceCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db_path = "channels.json"
+        self.registry = bot.registry  # Shared in-memory channels database
         self.developer_server_id = int(os.getenv("DEVELOPER_SERVER_ID"))  # Load from .env
+        self.last_batch = None  # Most recent announcement started by this process
+        self.progress_interval = 2  # Seconds between progress updates
+        # Tags announcements relayed by this process, so it ignores them when they come back
+        self.origin = uuid.uuid4().hex
+
+    async def check_developer_server(self, interaction: discord.Interaction):
+        """Return True if the command runs in the developer server, otherwise tell the user."""
+        # Check if the command is executed in the developer server
+        if interaction.guild is not None and interaction.guild.id == self.developer_server_id:
+            return True
+        embed = discord.Embed(
+            title="Permission Denied",
+            description="This command can only be used in the developer server.",
+            color=discord.Color.red()
+        )
+        embed.set_footer(text="Pépito Notification System")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        return False
+
+    def running_batches(self):
+        """Return the announcements still being delivered, including ones resumed after a restart."""
+        return [batch for batch in self.bot.delivery.batches.values() if batch.label == "announcement"]
+
+    def relay_api(self):
+        """Return the API connection cog when other bot processes are reachable over the event relay."""
+        api = self.bot.get_cog("APIConnectionCog")
+        return api if api is not None and api.ipc_role else None
+
+    def relay(self, event):
+        """Send an announcement event to the other bot processes, which deliver to their own shards' servers."""
+        api = self.relay_api()
+        if api is None:
+            return  # Single process, it already covers every server
+        if not api.relay({**event, "event": "announcement", "origin": self.origin}):
+            log.warning("Event relay not connected, other bot processes won't get this announcement.")
+
+    def start_announcement(self, message):
+        """Queue an announcement for the servers on this process's shards with a set channel."""
+        # Create an embed for the announcement, rendered once for every channel
+        embed = discord.Embed(
+            title="This is a global announcement from Pépito! 🐈",
+            description=message,
+            color=discord.Color.blue()
+        )
+        embed.set_footer(text="Pépito Notification System")
+
+        # Each process sends to its own shards' servers, the announcement reaches the others over the relay
+        targets = [
+            (channel_id, guild_id)
+            for guild_id, channel_id in self.registry.subscriptions.items()
+            if owns_guild(self.bot, guild_id)
+        ]
+        batch = self.bot.delivery.submit("announcement", embed_payload(embed), targets, priority=PRIORITY_ANNOUNCEMENT)
+        self.last_batch = batch
+        return batch
+
+    def cancel_announcements(self):
+        """Cancel this process's running announcements and return them."""
+        return [self.bot.delivery.cancel(batch.id) for batch in self.running_batches()]
+
+    async def handle_announcement(self, event):
+        """Start or cancel an announcement sent from another bot process."""
+        if event.get("origin") == self.origin:
+            return
+        if event.get("cancel"):
+            batches = self.cancel_announcements()
+            log.info("Cancelled %d announcements from another process.", len(batches))
+        else:
+            batch = self.start_announcement(event["message"])
+            log.info("Started announcement %s from another process for %d channels.", batch.id[:8], batch.remaining)
+
+    def progress_embed(self, batch):
+        """Build an embed showing how far an announcement got."""
+        failed = len(batch.dead)
+        if batch.cancelled:
+            title, color = "Announcement Cancelled", discord.Color.red()
+        elif not batch.done.is_set():
+            title, color = "Sending Announcement...", discord.Color.blue()
+        elif failed:
+            title, color = "Partial Success", discord.Color.orange()
+        else:
+            title, color = "Success", discord.Color.green()
+
+        embed = discord.Embed(title=title, color=color)
+        embed.add_field(name="Sent", value=str(batch.sent))
+        embed.add_field(name="Failed", value=str(failed))
+        embed.add_field(name="Remaining", value=str(0 if batch.cancelled else batch.remaining))
+        if failed:
+            failed_list = "\n".join(self.registry.server_name(guild_id) for guild_id, _, _ in batch.dead[:20])
+            if failed > 20:
+                failed_list += f"\n...and {failed - 20} more"
+            embed.description = f"Failed to deliver to the following servers:\n{failed_list}"
+        embed.set_footer(text=f"Announcement {batch.id[:8]} • Pépito Notification System")
+        return embed
+
+    async def report_progress(self, message, batch):
+        """Edit the progress message until the announcement finishes."""
+        while True:
+            try:
+                await asyncio.wait_for(batch.done.wait(), timeout=self.progress_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await message.edit(embed=self.progress_embed(batch))
+            except discord.HTTPException as e:
+                # The interaction token expires after 15 minutes, /announce-status still works
+                log.warning("Stopped announcement progress updates: %s", e)
+                return
+            if batch.done.is_set():
+                return
 
     @app_commands.command(name="announce", description="Send a global announcement to all servers.")
     async def announce(self, interaction: discord.Interaction, message: str):
-        # Check if the command is executed in the developer server
-        if interaction.guild.id != self.developer_server_id:
-            embed = discord.Embed(
-                title="Permission Denied",
-                description="This command can only be used in the developer server.",
-                color=discord.Color.red()
-            )
-            embed.set_footer(text="Pépito Notification System")
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+        if not await self.check_developer_server(interaction):
             return
 
-        # Load the channels database
-        if not os.path.exists(self.db_path):
+        # Make sure at least one server has a channel set, other processes know their own
+        if not self.registry.subscriptions and self.relay_api() is None:
             embed = discord.Embed(
                 title="No Channels Set",
                 description="No channels have been set yet.",
@@ -34,52 +144,58 @@ class AnnounceCog(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
 
-        with open(self.db_path, "r") as f:
-            data = json.load(f)
-
-        # Send the announcement to all servers with a set channel
-        failed_guilds = []
-        for guild_id, info in data.items():
-            # Check if "channel_id" exists in the guild's data
-            if "channel_id" not in info:
-                failed_guilds.append(info.get("server_name", f"Unknown Guild (ID: {guild_id})"))
-                continue
-
-            channel_id = int(info["channel_id"])
-            channel = self.bot.get_channel(channel_id)
-            if channel:
-                try:
-                    # Create an embed for the announcement
-                    embed = discord.Embed(
-                        title="This is a global announcement from Pépito! 🐈",
-                        description=message,
-                        color=discord.Color.blue()
-                    )
-                    embed.set_footer(text="Pépito Notification System")
-                    await channel.send(embed=embed)
-                except Exception as e:
-                    failed_guilds.append(info["server_name"])
-            else:
-                failed_guilds.append(info["server_name"])
-
-        # Respond to the user
-        if failed_guilds:
-            failed_list = "\n".join(failed_guilds)
+        # Answer right away, delivering takes longer than Discord's 3 second deadline
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        # Queue the announcement for this process's servers, delivered in the background,
+        # and relay it to the other bot processes for theirs
+        batch = self.start_announcement(message)
+        self.relay({"message": message})
+        metrics.announcements.inc()
+
+        progress = await interaction.followup.send(embed=self.progress_embed(batch), ephemeral=True, wait=True)
+        self.bot.loop.create_task(self.report_progress(progress, batch))
+
+    @app_commands.command(name="announce-status", description="Show the progress of global announcements.")
+    async def announce_status(self, interaction: discord.Interaction):
+        if not await self.check_developer_server(interaction):
+            return
+
+        batches = self.running_batches()
+        if not batches and self.last_batch is not None:
+            batches = [self.last_batch]
+        if not batches:
             embed = discord.Embed(
-                title="Partial Success",
-                description=f"Announcement sent, but failed to deliver to the following servers:\n{failed_list}",
-                color=discord.Color.orange()
+                title="No Announcements",
+                description="No announcement has been sent since the bot started.",
+                color=discord.Color.blue()
             )
             embed.set_footer(text="Pépito Notification System")
             await interaction.response.send_message(embed=embed, ephemeral=True)
-        else:
+            return
+
+        embeds = [self.progress_embed(batch) for batch in batches[:10]]
+        await interaction.response.send_message(embeds=embeds, ephemeral=True)
+
+    @app_commands.command(name="announce-cancel", description="Stop delivering the running global announcements.")
+    async def announce_cancel(self, interaction: discord.Interaction):
+        if not await self.check_developer_server(interaction):
+            return
+
+        self.relay({"cancel": True})
+        batches = self.cancel_announcements()
+        if not batches:
             embed = discord.Embed(
-                title="Success",
-                description="Announcement sent successfully to all servers!",
-                color=discord.Color.green()
+                title="Nothing to Cancel",
+                description="No announcement is being delivered right now.",
+                color=discord.Color.blue()
             )
             embed.set_footer(text="Pépito Notification System")
             await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+
+        embeds = [self.progress_embed(batch) for batch in batches[:10]]
+        await interaction.response.send_message(embeds=embeds, ephemeral=True)
 
 # Add this setup function
 async def setup(bot):
@@ -1,72 +1,150 @@
 import aiohttp
+import logging
 import os
-import asyncio
-import json
+import time
 from discord.ext import commands
+from utils import metrics
+from utils.ipc import EventPublisher, EventSubscriber, parse_address
+from utils.sse import MultiSourceSSE
+
+log = logging.getLogger(__name__)
 
 class APIConnectionCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.api_url = os.getenv("API_URL")  # Load API URL from .env
+        # API_URLS (comma separated) lists mirrors of the API read at the same time, API_URL a single one
+        self.api_urls = [url.strip() for url in os.getenv("API_URLS", "").split(",") if url.strip()]
+        if not self.api_urls:
+            self.api_urls = [os.getenv("API_URL")]  # Load API URL from .env
         self.session = aiohttp.ClientSession()  # Create an aiohttp session
-        self.bot.loop.create_task(self.listen_to_sse())  # Start listening to SSE events
+        # Reconnect when a stream goes quiet: no bytes for SSE_READ_TIMEOUT seconds,
+        # or no heartbeat for SSE_HEARTBEAT_TIMEOUT seconds (0 disables that check).
+        # A mirror trailing the fastest one by more than SSE_DEMOTE_LAG seconds
+        # is disconnected for SSE_DEMOTE_COOLDOWN seconds
+        self.stream = MultiSourceSSE(
+            self.session,
+            self.api_urls,
+            read_timeout=float(os.getenv("SSE_READ_TIMEOUT", "60")),
+            heartbeat_timeout=float(os.getenv("SSE_HEARTBEAT_TIMEOUT", "0")),
+            demote_lag=float(os.getenv("SSE_DEMOTE_LAG", "2")),
+            demote_cooldown=float(os.getenv("SSE_DEMOTE_COOLDOWN", "300")),
+        )
+        metrics.sse_connected.function = lambda: self.stream.connected
+        metrics.sse_since_last_byte.function = lambda: self.connection_health()["since_last_byte"]
+
+        # With several bot processes, one reads the SSE stream and relays events to the others
+        self.ipc_role = os.getenv("EVENT_IPC_ROLE")  # "publisher", "subscriber" or unset
+        host, port = parse_address(os.getenv("EVENT_IPC_ADDRESS", "127.0.0.1:8765"))
+        self.ipc_host, self.ipc_port = host, port
+        self.ipc_secret = os.getenv("EVENT_IPC_SECRET")  # Required from subscribers, and to listen beyond loopback
+        self.publisher = None
+        self.subscriber = None
+        self.task = None
+
+    async def cog_load(self):
+        """Start the one event consumer of this process."""
+        if self.task is not None:
+            return
+        if self.ipc_role == "subscriber":
+            self.subscriber = EventSubscriber(self.handle_published, self.ipc_host, self.ipc_port, secret=self.ipc_secret)
+            self.task = self.bot.loop.create_task(self.subscriber.run())  # Receive events from the relay
+        else:
+            if self.ipc_role == "publisher":
+                self.publisher = EventPublisher(self.ipc_host, self.ipc_port, on_message=self.handle_relayed,
+                                                secret=self.ipc_secret)
+                self.bot.loop.create_task(self.publisher.start())
+            self.task = self.bot.loop.create_task(self.listen_to_sse())  # Start listening to SSE events
 
     async def listen_to_sse(self):
         """Listen to SSE events from the API."""
-        while not self.bot.is_closed():
-            try:
-                async with self.session.get(self.api_url) as response:
-                    if response.status == 200:
-                        print("Connected to SSE stream.")
-                        async for line in response.content:
-                            # Decode the line and process the SSE event
-                            event_data = line.decode("utf-8").strip()
-                            if event_data:  # Ignore empty lines
-                                # Remove the 'data:' prefix if it exists
-                                if event_data.startswith("data:"):
-                                    event_data = event_data[len("data:"):].strip()
-
-                                # Parse the event data as JSON
-                                try:
-                                    event = json.loads(event_data)
-                                    # Skip logging for heartbeat events
-                                    if event.get("event") == "heartbeat":
-                                        continue
-                                    print(f"Received SSE event: {event_data}")
-                                    await self.process_event(event_data)
-                                except json.JSONDecodeError:
-                                    print(f"Failed to decode event data: {event_data}")
-                    else:
-                        print(f"Failed to connect to SSE stream: {response.status}")
-            except Exception as e:
-                print(f"Error in SSE connection: {e}")
-            await asyncio.sleep(5)  # Wait before retrying
-
-    async def process_event(self, event_data):
-        """Process the received SSE event."""
+        async for event in self.stream.events():
+            log.info("Received SSE event", extra={"fields": event})
+            metrics.events_received.inc()
+            if isinstance(event.get("time"), (int, float)):
+                metrics.sse_lag.observe(max(0.0, time.time() - event["time"]))
+            await self.process_event(event)
+
+    def connection_health(self):
+        """Return the SSE connection health, overall and per source (time since last byte/heartbeat, reconnects, stalls, lag).
+
+        Returns None when events come from the relay instead of the SSE stream.
+        """
+        if self.ipc_role == "subscriber":
+            return None
+        return self.stream.health()
+
+    async def process_event(self, event):
+        """Process a received SSE event (already parsed from JSON)."""
+        # The API only sends Pépito events; anything else must not pass for a relay message
+        if event.get("event") != "pepito":
+            log.debug("Ignoring SSE event of type %s.", event.get("event"))
+            return
         try:
-            # Remove the 'data:' prefix if it exists
-            if event_data.startswith("data:"):
-                event_data = event_data[len("data:"):].strip()
-
-            # Parse the event data as JSON
-            event = json.loads(event_data)
-
-            # Check if the event is of type "pepito"
-            if event.get("event") == "pepito":
-                # Pass the event to the pepito_events cog
-                pepito_cog = self.bot.get_cog("PepitoEventsCog")
-                if pepito_cog:
-                    await pepito_cog.handle_pepito_event(event)
-                else:
-                    print("PepitoEventsCog not found.")
-        except json.JSONDecodeError:
-            print(f"Failed to decode event data: {event_data}")
+            # Relay the event to the other bot processes
+            if self.publisher:
+                self.publisher.publish(event)
+
+            await self.dispatch_event(event)
         except Exception as e:
-            print(f"Error processing event: {e}")
+            log.exception("Error processing event: %s", e)
+
+    def relay(self, event):
+        """Send an event to the other bot processes, returning False when there is no relay."""
+        if self.publisher:
+            self.publisher.publish(event)
+            return True
+        if self.subscriber:
+            return self.subscriber.send(event)
+        return False
+
+    async def handle_relayed(self, event):
+        """Handle a message a subscriber process sent to this publisher."""
+        kind = event.get("event")
+        if kind == "announcement":
+            self.publisher.publish(event)  # Pass it on to every subscriber, the sender ignores its own
+            await self.dispatch_announcement(event)
+        elif kind == "delivery_result":
+            # Reported by a delivery worker, whose channels database is read-only
+            self.bot.registry.record_delivery(event["guild_id"], event["channel_id"], event["error"])
+        elif kind == "webhook_gone":
+            self.bot.registry.forget_webhook(event["channel_id"])
+        else:
+            log.warning("Ignoring relay message of type %s from a subscriber.", kind)
+
+    async def handle_published(self, event):
+        """Handle a message the publisher relayed to this subscriber: a Pépito event or an announcement."""
+        kind = event.get("event")
+        if kind == "announcement":
+            await self.dispatch_announcement(event)
+        elif kind == "pepito":
+            await self.dispatch_event(event)
+        else:
+            log.warning("Ignoring relay message of type %s.", kind)
+
+    async def dispatch_announcement(self, event):
+        """Pass an announcement from another bot process to the announcement cog."""
+        # Delivery workers don't load the announcement cog and skip these
+        announce_cog = self.bot.get_cog("AnnounceCog")
+        if announce_cog:
+            await announce_cog.handle_announcement(event)
+
+    async def dispatch_event(self, event):
+        """Route a parsed event to the cog that handles it."""
+        # Check if the event is of type "pepito"
+        if event.get("event") == "pepito":
+            # Pass the event to the pepito_events cog
+            pepito_cog = self.bot.get_cog("PepitoEventsCog")
+            if pepito_cog:
+                await pepito_cog.handle_pepito_event(event)
+            else:
+                log.error("PepitoEventsCog not found.")
 
     def cog_unload(self):
         """Cleanup when the cog is unloaded."""
+        if self.task is not None:
+            self.task.cancel()
+        if self.publisher:
+            self.bot.loop.create_task(self.publisher.close())
         self.bot.loop.create_task(self.session.close())
 
 # Add this setup function
@@ -1,6 +1,9 @@
 import discord
+import logging
 from discord.ext import commands
 
+log = logging.getLogger(__name__)
+
 class HelloCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -30,7 +33,7 @@ class HelloCog(commands.Cog):
             try:
                 await channel.send(embed=embed)
             except Exception as e:
-                print(f"Failed to send welcome message to {guild.name}: {e}")
+                log.warning("Failed to send welcome message to %s: %s", guild.name, e)
 
 # Add this setup function
 async def setup(bot):
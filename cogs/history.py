@@ -0,0 +1,63 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+import time
+
+def format_duration(seconds):
+    """Format a number of seconds as e.g. "2h 05m"."""
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes}m"
+    return f"{minutes // 60}h {minutes % 60:02d}m"
+
+class HistoryCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.history = bot.history  # Shared event history, recorded by PepitoEventsCog
+
+    async def cog_unload(self):
+        """Write events not saved yet before the cog goes away."""
+        await self.history.flush()
+
+    @app_commands.command(name="history", description="Show Pépito's latest trips in and out.")
+    @app_commands.describe(count="Number of events to show (1-25)")
+    async def history_command(self, interaction: discord.Interaction, count: app_commands.Range[int, 1, 25] = 10):
+        events = self.history.last(count)
+        if not events:
+            description = "No events have been recorded yet."
+        else:
+            # Discord shows these timestamps in each reader's own timezone
+            description = "\n".join(
+                f"<t:{event_time}:f> - {'came back home' if event_type == 'in' else 'went out'}"
+                for event_time, event_type in events
+            )
+
+        embed = discord.Embed(
+            title=f"Pépito's last {len(events)} events" if events else "Pépito's history",
+            description=description,
+            color=discord.Color.blue()
+        )
+        embed.set_footer(text="Pépito Notification System")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="stats", description="Show statistics about Pépito's trips.")
+    async def stats(self, interaction: discord.Interaction):
+        now = time.time()
+        trips_today, outside_today = self.history.today(now)
+        trips_per_day, outside_per_day = self.history.averages(now)
+
+        embed = discord.Embed(title="Pépito's statistics", color=discord.Color.blue())
+        if self.history.state is not None:
+            status = "Outside" if self.history.state == "out" else "Home"
+            embed.add_field(name="Status", value=f"{status} since <t:{self.history.state_since}:R>", inline=False)
+        embed.add_field(name="Trips today", value=str(trips_today))
+        embed.add_field(name="Time outside today", value=format_duration(outside_today))
+        embed.add_field(name="Trips per day", value=f"{trips_per_day:.1f}")
+        embed.add_field(name="Time outside per day", value=format_duration(outside_per_day))
+        embed.add_field(name="Total trips", value=str(self.history.total_trips))
+        embed.set_footer(text="Pépito Notification System")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# Add this setup function
+async def setup(bot):
+    await bot.add_cog(HistoryCog(bot))
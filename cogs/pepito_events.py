@@ -1,71 +1,136 @@
 import discord
+import asyncio
+import logging
 import os
-import json
 from datetime import datetime
 import pytz  # Import pytz for timezone handling
 from discord.ext import commands
+from utils import metrics
+from utils.dedupe import EventDeduplicator
+from utils.payloads import embed_payload
+from utils.recipients import RecipientIndex
+from utils.sharding import owns_guild
+
+log = logging.getLogger(__name__)
 
 class PepitoEventsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db_path = "channels.json"  # Path to the channels database
-        self.oslo_tz = pytz.timezone("Europe/Oslo")  # Set the timezone to Europe/Oslo
+        self.registry = bot.registry  # Shared in-memory channels database
+        # Channels by the event types they want and quiet hours, other processes
+        # deliver to the guilds on their shards
+        self.recipients = RecipientIndex(self.registry, include=lambda guild_id: owns_guild(self.bot, guild_id))
+        self.registry.on_change = self.recipients.guild_changed  # Reindex just the guilds that change
+        self.recipients.rebuild()
+        # Events replayed after a reconnect are dropped, keyed on (type, time)
+        self.dedupe = EventDeduplicator(
+            max_size=int(os.getenv("EVENT_DEDUPE_SIZE", "1024")),
+            ttl=float(os.getenv("EVENT_DEDUPE_TTL", "86400")),
+        )
+        # Events are held for COALESCE_WINDOW seconds and only the latest one is sent,
+        # so a cat going in and out within seconds is one notification (0 sends right away)
+        self.coalesce_window = float(os.getenv("COALESCE_WINDOW", "0"))
+        self.pending_event = None  # Latest event waiting for the coalescing window to end
+        self.coalesced = 0  # Events merged into the pending one
+        self.coalesce_task = None
+        self.last_batches = []  # Batches of the last event sent, one per timezone
+        # EVENT_DELIVERY=worker leaves delivering Pépito events to worker.py processes
+        self.deliver_events = os.getenv("EVENT_DELIVERY", "local") != "worker"
+
+    async def cog_unload(self):
+        """Send a held event, stop the delivery workers and save the queue."""
+        self.registry.on_change = None
+        if self.coalesce_task is not None and not self.coalesce_task.done():
+            self.coalesce_task.cancel()
+            self.flush_pending()
+        await self.bot.delivery.close()
+        await self.bot.sender.close()
 
     async def handle_pepito_event(self, event):
-        """Handle a pepito event and post embeds to channels."""
-        try:
-            event_type = event.get("type")
-            event_time = event.get("time")
-            event_img = event.get("img")
+        """Handle a pepito event, dropping repeats and coalescing rapid flips."""
+        if self.dedupe.check((event.get("type"), event.get("time"))):
+            metrics.events_duplicate.inc()
+            log.info("Skipping duplicate pepito %s event at %s.", event.get("type"), event.get("time"))
+            return
+        # Every distinct event goes in the history, including ones coalesced away below
+        if self.bot.history is not None:
+            self.bot.history.record(event.get("type"), event.get("time"))
+        if not self.deliver_events:
+            return
 
-            # Ensure all required fields are present
-            if event_type and event_time and event_img:
-                # Convert the event time to Europe/Oslo timezone
-                utc_time = datetime.utcfromtimestamp(event_time).replace(tzinfo=pytz.utc)
-                oslo_time = utc_time.astimezone(self.oslo_tz)
-                formatted_time = oslo_time.strftime("%H:%M:%S")
+        if self.coalesce_window <= 0:
+            self.send_event(event)
+            return
 
-                # Customize the title based on the event type
-                if event_type == "in":
-                    title = f"Pépito is back home! ({formatted_time})"
-                else:
-                    title = f"Pépito is {event_type}! ({formatted_time})"
+        if self.pending_event is not None:
+            self.coalesced += 1
+            metrics.events_coalesced.inc()
+        self.pending_event = event
+        if self.coalesce_task is None or self.coalesce_task.done():
+            self.coalesce_task = asyncio.create_task(self.send_after_window())
 
-                # Create an embed for the event
-                embed = discord.Embed(
-                    title=title,
-                    color=discord.Color.blue()
-                )
-                embed.set_image(url=event_img)
-                embed.set_footer(text="Pépito Notification System")
+    async def send_after_window(self):
+        """Wait out the coalescing window, then send the latest event."""
+        await asyncio.sleep(self.coalesce_window)
+        self.flush_pending()
 
-                # Load the channels database
-                if not os.path.exists(self.db_path):
-                    print("Channels database not found.")
-                    return
+    def flush_pending(self):
+        """Send the held event, if any."""
+        event, coalesced = self.pending_event, self.coalesced
+        self.pending_event, self.coalesced = None, 0
+        if event is None:
+            return
+        if coalesced:
+            log.info("Coalesced %d pepito events into the %s event at %s.", coalesced, event.get("type"), event.get("time"))
+        # Channels still waiting for the previous event would get an outdated state
+        for batch in self.last_batches:
+            if batch.id in self.bot.delivery.batches:
+                self.bot.delivery.cancel(batch.id)
+        self.send_event(event)
 
-                with open(self.db_path, "r", encoding="utf-8") as f:
-                    channels = json.load(f)
+    def build_payload(self, event_type, event_time, event_img, timezone):
+        """Render the embed for an event with the time shown in `timezone`."""
+        # Convert the event time to the guild's timezone
+        utc_time = datetime.utcfromtimestamp(event_time).replace(tzinfo=pytz.utc)
+        local_time = utc_time.astimezone(pytz.timezone(timezone))
+        formatted_time = local_time.strftime("%H:%M:%S")
 
-                # Send the embed to all channels in the database
-                for guild_id, info in channels.items():
-                    # Check if "channel_id" exists in the guild's data
-                    if "channel_id" not in info:
-                        print(f"Skipping guild {info.get('server_name', 'Unknown Guild')} (ID: {guild_id}) due to missing channel_id.")
-                        continue
+        # Customize the title based on the event type
+        if event_type == "in":
+            title = f"Pépito is back home! ({formatted_time})"
+        else:
+            title = f"Pépito is {event_type}! ({formatted_time})"
 
-                    channel_id = int(info["channel_id"])
-                    channel = self.bot.get_channel(channel_id)
-                    if channel:
-                        try:
-                            await channel.send(embed=embed)
-                            print(f"Sent embed to channel {channel_id} in guild {info['server_name']}")
-                        except Exception as e:
-                            print(f"Failed to send embed to channel {channel_id}: {e}")
-                    else:
-                        print(f"Channel {channel_id} not found in guild {info['server_name']}")
+        # Create an embed for the event
+        embed = discord.Embed(
+            title=title,
+            color=discord.Color.blue()
+        )
+        embed.set_image(url=event_img)
+        embed.set_footer(text="Pépito Notification System")
+        return embed_payload(embed)
+
+    def send_event(self, event):
+        """Queue the embed for an event for every channel that wants it."""
+        try:
+            event_type = event.get("type")
+            event_time = event.get("time")
+            event_img = event.get("img")
+
+            # Ensure all required fields are present
+            if event_type and event_time and event_img:
+                # Only channels that want this event type and aren't in quiet hours,
+                # the embed is rendered once per timezone they display times in
+                self.last_batches = [
+                    self.bot.delivery.submit(
+                        f"pepito {event_type} event ({timezone})",
+                        self.build_payload(event_type, event_time, event_img, timezone),
+                        targets,
+                    )
+                    for timezone, targets in self.recipients.targets(event_type).items()
+                ]
         except Exception as e:
-            print(f"Error handling pepito event: {e}")
+            log.exception("Error handling pepito event: %s", e)
 
 # Add this setup function
 async def setup(bot):
@@ -0,0 +1,111 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+from typing import Optional
+import pytz
+from utils.recipients import DEFAULT_TIMEZONE
+
+EVENT_CHOICES = [
+    app_commands.Choice(name="All events", value="all"),
+    app_commands.Choice(name="Only when Pépito comes home", value="in"),
+    app_commands.Choice(name="Only when Pépito goes out", value="out"),
+]
+
+class PreferencesCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.registry = bot.registry  # Shared in-memory channels database
+
+    def is_admin():
+        """Check if the user has administrator permissions."""
+        async def predicate(interaction: discord.Interaction):
+            return interaction.user.guild_permissions.administrator
+        return app_commands.check(predicate)
+
+    def preferences_embed(self, guild_id, title="Notification Settings", color=discord.Color.blue()):
+        """Build an embed showing a guild's notification preferences."""
+        preferences = self.registry.preferences(guild_id)
+        event_types = preferences.get("event_types")
+        quiet_hours = preferences.get("quiet_hours")
+
+        embed = discord.Embed(title=title, color=color)
+        events = next((choice.name for choice in EVENT_CHOICES if event_types == [choice.value]), "All events")
+        embed.add_field(name="Events", value=events, inline=False)
+        embed.add_field(
+            name="Quiet hours",
+            value=f"{quiet_hours[0]:02d}:00 - {quiet_hours[1]:02d}:00" if quiet_hours else "None",
+            inline=False
+        )
+        embed.add_field(name="Timezone", value=preferences.get("timezone", DEFAULT_TIMEZONE), inline=False)
+        embed.set_footer(text="Pépito Notification System")
+        return embed
+
+    @app_commands.command(name="notifications", description="Choose which Pépito events this server gets, and when.")
+    @app_commands.describe(
+        events="Which events to post",
+        quiet_start="Hour quiet hours start (0-23), no notifications until quiet_end",
+        quiet_end="Hour quiet hours end (0-23), the same hour as quiet_start turns quiet hours off",
+        timezone="Timezone for times and quiet hours, e.g. Europe/Oslo"
+    )
+    @app_commands.choices(events=EVENT_CHOICES)
+    @is_admin()  # Restrict to administrators
+    async def notifications(
+        self,
+        interaction: discord.Interaction,
+        events: Optional[app_commands.Choice[str]] = None,
+        quiet_start: Optional[app_commands.Range[int, 0, 23]] = None,
+        quiet_end: Optional[app_commands.Range[int, 0, 23]] = None,
+        timezone: Optional[str] = None
+    ):
+        guild_id = str(interaction.guild.id)
+        error = None
+        if (quiet_start is None) != (quiet_end is None):
+            error = "Set both `quiet_start` and `quiet_end`, or neither."
+        elif timezone is not None and timezone not in pytz.all_timezones_set:
+            error = f"Unknown timezone `{timezone}`. Pick one from the list, e.g. `Europe/Oslo`."
+        if error:
+            embed = discord.Embed(title="Invalid Settings", description=error, color=discord.Color.red())
+            embed.set_footer(text="Pépito Notification System")
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+
+        # Without options, just show the current settings
+        changes = {}
+        if events is not None:
+            changes["event_types"] = None if events.value == "all" else [events.value]
+        if quiet_start is not None:
+            changes["quiet_hours"] = None if quiet_start == quiet_end else [quiet_start, quiet_end]
+        if timezone is not None:
+            changes["timezone"] = None if timezone == DEFAULT_TIMEZONE else timezone
+        if not changes:
+            await interaction.response.send_message(embed=self.preferences_embed(guild_id), ephemeral=True)
+            return
+
+        self.registry.add_guild(guild_id, interaction.guild.name)
+        self.registry.set_preferences(guild_id, **changes)
+        embed = self.preferences_embed(guild_id, title="Notification Settings Updated", color=discord.Color.green())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @notifications.autocomplete("timezone")
+    async def timezone_autocomplete(self, interaction: discord.Interaction, current: str):
+        """Suggest timezones matching what has been typed so far."""
+        current = current.lower()
+        matches = [name for name in pytz.common_timezones if current in name.lower()]
+        return [app_commands.Choice(name=name, value=name) for name in matches[:25]]
+
+    @notifications.error
+    async def notifications_error(self, interaction: discord.Interaction, error):
+        """Handle errors for the /notifications command."""
+        if isinstance(error, app_commands.CheckFailure):
+            # Create an embed for the error message
+            embed = discord.Embed(
+                title="Permission Denied",
+                description="You do not have permission to use this command. Only administrators can change notification settings.",
+                color=discord.Color.red()
+            )
+            embed.set_footer(text="Pépito Notification System")
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+
+# Add this setup function
+async def setup(bot):
+    await bot.add_cog(PreferencesCog(bot))
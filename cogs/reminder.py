@@ -1,18 +1,38 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
+import asyncio
+import heapq
 import json
+import logging
 import os
+import time
 from datetime import datetime, timedelta
+from utils import metrics
+from utils.delivery_queue import PRIORITY_REMINDER
+from utils.payloads import get_template
+from utils.sharding import shard_path
+
+log = logging.getLogger(__name__)
 
 class ReminderCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db_path = "channels.json"
-        self.reminder_log_path = "reminder_log.json"  # File to store reminder timestamps
-        self.reminder_task.start()  # Start the reminder task when the cog is loaded
+        self.registry = bot.registry  # Shared in-memory channels database
+        # File to store reminder timestamps, one per shard process as each rewrites it whole
+        self.reminder_log_path = os.getenv("REMINDER_LOG", shard_path("reminder_log.json"))
+        self.interval = timedelta(days=1).total_seconds()  # Time between reminders to the same guild
+        self.spacing = float(os.getenv("REMINDER_SPACING", "1"))  # Seconds between two reminders
+        self.reminder_log = self.load_reminder_log()
+        self.log_dirty = False  # The reminder log has changes not yet saved
+        self.heap = []  # (due timestamp, guild_id) of unconfigured guilds, soonest first
+        self.due = {}  # guild_id -> due timestamp, entries in the heap that don't match are stale
+        self.targets = {}  # guild_id -> id of the channel reminders are sent to
+        self.wakeup = asyncio.Event()  # Set when an earlier reminder was scheduled
+        self.task = self.bot.loop.create_task(self.run_scheduler())  # Start the reminder scheduler
 
-    def cog_unload(self):
-        self.reminder_task.cancel()  # Stop the task when the cog is unloaded
+    async def cog_unload(self):
+        self.task.cancel()  # Stop the scheduler when the cog is unloaded
+        await self.save_reminder_log()
 
     def load_reminder_log(self):
         """Load the reminder log from a file."""
@@ -21,66 +41,162 @@ class ReminderCog(commands.Cog):
                 return json.load(f)
         return {}
 
-    def save_reminder_log(self, log):
-        """Save the reminder log to a file."""
+    async def save_reminder_log(self):
+        """Save the reminder log to a file if it changed."""
+        if not self.log_dirty:
+            return
+        self.log_dirty = False
+        payload = json.dumps(self.reminder_log, indent=4)
+        await asyncio.to_thread(self._write_reminder_log, payload)
+
+    def _write_reminder_log(self, payload):
         with open(self.reminder_log_path, "w") as f:
-            json.dump(log, f, indent=4)
+            f.write(payload)
 
-    @tasks.loop(hours=24)  # Run the reminder task every 24 hours
-    async def reminder_task(self):
-        # Load the channels database
-        if not os.path.exists(self.db_path):
-            print(f"{self.db_path} not found. Skipping reminder task.")
-            return
+    @staticmethod
+    def build_reminder_embed():
+        """Build the reminder embed, with an {owner_id} placeholder filled in per guild."""
+        embed = discord.Embed(
+            title="Pépito Reminder",
+            description=(
+                "Hello <@{owner_id}>, it seems you haven't set a notification channel for Pépito yet! "
+                "Please use the `/setchannel` command to configure one."
+            ),
+            color=discord.Color.orange()
+        )
+        embed.set_footer(text="Pépito Notification System")  # Add footer to the embed
+        return embed
 
-        with open(self.db_path, "r") as f:
-            data = json.load(f)
+    @staticmethod
+    def build_disabled_embed():
+        """Build the reminder embed for guilds whose channel was disabled after repeated failures."""
+        embed = discord.Embed(
+            title="Pépito Reminder",
+            description=(
+                "Hello <@{owner_id}>, Pépito notifications to <#{channel_id}> were stopped because "
+                "I could not post there anymore (the channel was deleted or I lost permission). "
+                "Please use the `/setchannel` command to configure a new one."
+            ),
+            color=discord.Color.orange()
+        )
+        embed.set_footer(text="Pépito Notification System")  # Add footer to the embed
+        return embed
 
-        # Load the reminder log
-        reminder_log = self.load_reminder_log()
+    def render_reminder(self, guild):
+        """Return the prebuilt reminder payload for a guild."""
+        info = self.registry.get(guild.id) or {}
+        if "disabled_channel_id" in info:
+            template = get_template("reminder_disabled", self.build_disabled_embed)
+            return template.render(owner_id=guild.owner_id, channel_id=info["disabled_channel_id"])
+        return get_template("reminder", self.build_reminder_embed).render(owner_id=guild.owner_id)
 
-        # Iterate through all guilds the bot is in
-        for guild in self.bot.guilds:
-            guild_id = str(guild.id)
+    def schedule(self, guild_id, due):
+        """Schedule (or reschedule) the next reminder of a guild."""
+        self.due[guild_id] = due
+        heapq.heappush(self.heap, (due, guild_id))
+        if self.heap[0][1] == guild_id:
+            self.wakeup.set()  # The scheduler may be sleeping until a later reminder
 
-            # Skip guilds that already have a channel set
-            if guild_id in data and "channel_id" in data[guild_id]:
+    def schedule_all(self):
+        """Schedule every unconfigured guild from the reminder log."""
+        now = time.time()
+        for guild in self.bot.guilds:
+            if self.registry.is_subscribed(guild.id):
                 continue
-
-            # Check if a reminder was sent recently
-            last_reminder = reminder_log.get(guild_id)
+            due = now
+            last_reminder = self.reminder_log.get(str(guild.id))
             if last_reminder:
                 last_reminder_time = datetime.fromisoformat(last_reminder)
-                if datetime.utcnow() - last_reminder_time < timedelta(days=1):
-                    print(f"Skipping reminder for {guild.name} (ID: {guild.id}) - reminder sent recently.")
-                    continue
-
-            # Find a channel where the bot can send messages
-            for channel in guild.text_channels:
-                if channel.permissions_for(guild.me).send_messages:
-                    # Create the reminder embed
-                    embed = discord.Embed(
-                        title="Pépito Reminder",
-                        description=(
-                            f"Hello <@{guild.owner_id}>, it seems you haven't set a notification channel for Pépito yet! "
-                            f"Please use the `/setchannel` command to configure one."
-                        ),
-                        color=discord.Color.orange()
-                    )
-                    embed.set_footer(text="Pépito Notification System")  # Add footer to the embed
-                    try:
-                        await channel.send(embed=embed)
-                        print(f"Sent reminder to {guild.name} (ID: {guild.id}) in channel {channel.name}.")
-                        # Update the reminder log
-                        reminder_log[guild_id] = datetime.utcnow().isoformat()
-                        self.save_reminder_log(reminder_log)
-                    except Exception as e:
-                        print(f"Failed to send reminder to {guild.name} (ID: {guild.id}): {e}")
-                    break  # Stop after sending the message to one channel
-
-    @reminder_task.before_loop
-    async def before_reminder_task(self):
+                due = max(now, now + self.interval - (datetime.utcnow() - last_reminder_time).total_seconds())
+            self.schedule(guild.id, due)
+        log.info("Scheduled reminders for %d guilds without a notification channel.", len(self.due))
+
+    def find_target(self, guild):
+        """Return the channel to send a guild's reminders to, or None."""
+        # Reuse the previous choice while the bot can still post there
+        channel = guild.get_channel(self.targets.get(guild.id, 0))
+        if channel is not None and channel.permissions_for(guild.me).send_messages:
+            return channel
+
+        # Find a channel where the bot can send messages
+        for channel in guild.text_channels:
+            if channel.permissions_for(guild.me).send_messages:
+                self.targets[guild.id] = channel.id
+                return channel
+        self.targets.pop(guild.id, None)
+        return None
+
+    async def run_scheduler(self):
+        """Send each reminder when it is due, one at a time."""
         await self.bot.wait_until_ready()  # Wait until the bot is ready before starting the task
+        self.schedule_all()
+        while True:
+            if not self.heap:
+                await self.save_reminder_log()
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+
+            due, guild_id = self.heap[0]
+            delay = due - time.time()
+            if delay > 0:
+                # Write the log while idle, then sleep until the next reminder or an earlier one is scheduled
+                await self.save_reminder_log()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+                continue
+
+            heapq.heappop(self.heap)
+            if self.due.get(guild_id) != due:
+                continue  # Rescheduled or forgotten since it was pushed
+            del self.due[guild_id]
+
+            if self.send_reminder(guild_id):
+                # Spread reminders out so they don't compete with event delivery in bursts
+                await asyncio.sleep(self.spacing)
+
+    def send_reminder(self, guild_id):
+        """Queue the reminder of a guild and schedule the next one. Returns True if one was queued."""
+        guild = self.bot.get_guild(guild_id)
+        # Skip guilds the bot left or that have set a channel since
+        if guild is None or self.registry.is_subscribed(guild_id):
+            return False
+        self.schedule(guild_id, time.time() + self.interval)
+
+        channel = self.find_target(guild)
+        if channel is None:
+            log.info("Skipping reminder for %s (ID: %s) - no channel to post in.", guild.name, guild.id)
+            return False
+
+        self.bot.delivery.submit(
+            f"reminder for {guild.name}", self.render_reminder(guild), [(channel.id, str(guild_id))],
+            priority=PRIORITY_REMINDER,
+        )
+        log.debug("Queued reminder for %s (ID: %s) in channel %s.", guild.name, guild.id, channel.name)
+        metrics.reminders_sent.inc()
+        # Update the reminder log, written in batches while the scheduler is idle
+        self.reminder_log[str(guild_id)] = datetime.utcnow().isoformat()
+        self.log_dirty = True
+        return True
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        """Remind new guilds a day after the welcome message if they still have no channel."""
+        self.schedule(guild.id, time.time() + self.interval)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        """Forget the reminders of guilds the bot was removed from."""
+        self.due.pop(guild.id, None)
+        self.targets.pop(guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_channel_disabled(self, guild_id):
+        """Tell the owner right away when their notification channel was disabled."""
+        self.schedule(int(guild_id), time.time())
 
 # Add this setup function
 async def setup(bot):
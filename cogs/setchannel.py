@@ -1,46 +1,58 @@
 import discord
+import logging
 from discord.ext import commands
 from discord import app_commands
-import json
-import os
+
+log = logging.getLogger(__name__)
 
 class SetChannelCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db_path = "channels.json"
-        # Ensure the JSON database exists
-        if not os.path.exists(self.db_path):
-            with open(self.db_path, "w") as f:
-                json.dump({}, f)
+        self.registry = bot.registry  # Shared in-memory channels database
+        self.checked_guilds = False  # on_ready fires again after reconnects, only check once
+
+    async def cog_unload(self):
+        """Write pending database changes before the cog goes away."""
+        await self.registry.flush()
 
     async def ensure_all_guilds_in_db(self):
         """Ensure all guilds the bot is in are added to the database."""
-        # Load the current database
-        if os.path.exists(self.db_path):
-            with open(self.db_path, "r") as f:
-                data = json.load(f)
-        else:
-            data = {}
-
-        # Check all guilds the bot is in
+        # Add any guild the bot is in that the database doesn't know about yet
+        added = 0
         for guild in self.bot.guilds:
-            guild_id = str(guild.id)
-            if guild_id not in data:
-                # Add the guild to the database if it doesn't already exist
-                data[guild_id] = {
-                    "server_name": guild.name
-                }
-                print(f"Added missing guild {guild.name} (ID: {guild_id}) to the database.")
-
-        # Save the updated database
-        with open(self.db_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+            if self.registry.add_guild(guild.id, guild.name):
+                added += 1
+                log.debug("Added missing guild %s (ID: %s) to the database.", guild.name, guild.id)
+        if added:
+            log.info("Added %d missing guilds to the database.", added)
 
     @commands.Cog.listener()
     async def on_ready(self):
         """Ensure all guilds are in the database when the bot starts."""
+        if self.checked_guilds:
+            return
+        self.checked_guilds = True
         await self.ensure_all_guilds_in_db()
 
+    async def channel_webhook(self, channel: discord.TextChannel):
+        """Return (webhook_id, webhook_token) of the bot's webhook in a channel, creating it if needed.
+
+        Returns None if the bot may not manage webhooks there or Discord refused
+        (e.g. the channel has the maximum number of webhooks), so the channel
+        is still set and gets bot messages.
+        """
+        try:
+            for webhook in await channel.webhooks():
+                if webhook.user is not None and webhook.user.id == self.bot.user.id and webhook.token:
+                    return webhook.id, webhook.token
+            webhook = await channel.create_webhook(name="Pépito", reason="Pépito notifications")
+            return webhook.id, webhook.token
+        except discord.Forbidden:
+            return None
+        except discord.HTTPException as e:
+            log.warning("Could not set up a webhook in channel %s of %s: %s", channel.id, channel.guild.name, e)
+            return None
+
     def is_admin():
         """Check if the user has administrator permissions."""
         async def predicate(interaction: discord.Interaction):
@@ -54,19 +66,15 @@ class SetChannelCog(commands.Cog):
         guild_name = interaction.guild.name
         channel_id = str(channel.id)
 
-        # Load the current database
-        with open(self.db_path, "r") as f:
-            data = json.load(f)
+        # With DELIVERY_MODE=webhook, notifications go through a webhook in the channel
+        webhook = None
+        if self.bot.webhook_delivery:
+            # Answer within Discord's 3 second deadline, setting up the webhook takes extra requests
+            await interaction.response.defer(ephemeral=True)
+            webhook = await self.channel_webhook(channel)
 
         # Update the database with the new channel information
-        data[guild_id] = {
-            "server_name": guild_name,
-            "channel_id": channel_id
-        }
-
-        # Save the updated database with special characters preserved
-        with open(self.db_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        self.registry.set_channel(guild_id, guild_name, channel_id, webhook)
 
         # Create an embed for the response
         embed = discord.Embed(
@@ -76,9 +84,18 @@ class SetChannelCog(commands.Cog):
         )
         embed.add_field(name="Server Name", value=guild_name, inline=False)
         embed.add_field(name="Channel ID", value=channel_id, inline=False)
+        if self.bot.webhook_delivery:
+            if webhook is not None:
+                delivery = "Through a webhook"
+            else:
+                delivery = "As bot messages (give me the Manage Webhooks permission and run /setchannel again to use a webhook)"
+            embed.add_field(name="Delivery", value=delivery, inline=False)
         embed.set_footer(text="Pépito Notification System")
 
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        if interaction.response.is_done():
+            await interaction.followup.send(embed=embed, ephemeral=True)
+        else:
+            await interaction.response.send_message(embed=embed, ephemeral=True)
 
     @setchannel.error
     async def setchannel_error(self, interaction: discord.Interaction, error):
@@ -96,41 +113,16 @@ class SetChannelCog(commands.Cog):
     @commands.Cog.listener()
     async def on_guild_join(self, guild: discord.Guild):
         """Add the guild to the database when the bot is added to the server."""
-        guild_id = str(guild.id)
-        guild_name = guild.name
-
-        # Load the current database
-        if os.path.exists(self.db_path):
-            with open(self.db_path, "r") as f:
-                data = json.load(f)
-        else:
-            data = {}
-
         # Add the guild to the database if it doesn't already exist
-        if guild_id not in data:
-            data[guild_id] = {
-                "server_name": guild_name
-            }
-            with open(self.db_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
-            print(f"Added guild {guild_name} (ID: {guild_id}) to the database.")
+        if self.registry.add_guild(guild.id, guild.name):
+            log.info("Added guild %s (ID: %s) to the database.", guild.name, guild.id)
 
     @commands.Cog.listener()
     async def on_guild_remove(self, guild: discord.Guild):
         """Remove the guild from the database when the bot is removed from the server."""
-        guild_id = str(guild.id)
-
-        # Load the current database
-        if os.path.exists(self.db_path):
-            with open(self.db_path, "r") as f:
-                data = json.load(f)
-
-            # Remove the guild from the database if it exists
-            if guild_id in data:
-                del data[guild_id]
-                with open(self.db_path, "w", encoding="utf-8") as f:
-                    json.dump(data, f, indent=4, ensure_ascii=False)
-                print(f"Removed guild {guild.name} (ID: {guild_id}) from the database.")
+        # Remove the guild from the database if it exists
+        if self.registry.remove_guild(guild.id):
+            log.info("Removed guild %s (ID: %s) from the database.", guild.name, guild.id)
 
 # Add this setup function
 async def setup(bot):
@@ -0,0 +1,28 @@
+from utils import dedupe
+from utils.dedupe import EventDeduplicator
+
+
+def test_repeat_does_not_extend_ttl(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(dedupe.time, "monotonic", lambda: now[0])
+    deduplicator = EventDeduplicator(ttl=0.3)
+
+    assert not deduplicator.check("A")
+    now[0] = 0.1
+    assert not deduplicator.check("B")
+    now[0] = 0.15
+    assert deduplicator.check("A")
+
+    now[0] = 0.35  # A expired, B is still fresh
+    assert not deduplicator.check("A")
+    assert deduplicator.check("B")
+
+
+def test_max_size_evicts_oldest():
+    deduplicator = EventDeduplicator(max_size=2)
+    for key in ("A", "B", "C"):
+        assert not deduplicator.check(key)
+
+    assert len(deduplicator) == 2
+    assert deduplicator.check("C")
+    assert not deduplicator.check("A")
@@ -0,0 +1,109 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from utils.delivery_queue import DeliveryQueue
+
+MESSAGE = SimpleNamespace(payload={"content": "Pépito is out!"})
+TARGETS = [(10, "1"), (20, "2"), (30, "3")]
+
+
+class FakeSender:
+    """Delivers to every channel except those in `hang`, which never complete."""
+
+    max_concurrency = 4
+
+    def __init__(self, hang=(), journal=None):
+        self.hang = set(hang)
+        self.journal = journal  # When set, checks the batch is journaled before anything is sent
+        self.sent = []
+
+    async def send(self, channel_id, params):
+        if self.journal is not None:
+            with open(self.journal, encoding="utf-8") as f:
+                assert any(json.loads(line)["op"] == "batch" for line in f)
+        if channel_id in self.hang:
+            await asyncio.Event().wait()
+        self.sent.append(channel_id)
+
+
+def make_queue(tmp_path, sender):
+    return DeliveryQueue(
+        sender, path=str(tmp_path / "queue.journal"), dead_letter_path=str(tmp_path / "dead.jsonl"),
+        flush_interval=0.01,
+    )
+
+
+async def crash(queue):
+    """Stop the workers without the final flush close() would do."""
+    for task in queue._tasks:
+        task.cancel()
+    await asyncio.gather(*queue._tasks, return_exceptions=True)
+
+
+def test_batch_is_journaled_before_sending(tmp_path):
+    async def run():
+        queue = make_queue(tmp_path, FakeSender(journal=tmp_path / "queue.journal"))
+        await queue.start()
+        batch = queue.submit("pepito out", MESSAGE, TARGETS)
+        await asyncio.wait_for(batch.done.wait(), 1)
+        await queue.close()
+        return queue.sender.sent
+
+    assert sorted(asyncio.run(run())) == [10, 20, 30]
+
+
+def test_restart_resumes_undelivered_channels(tmp_path):
+    async def first_run():
+        queue = make_queue(tmp_path, FakeSender(hang={20, 30}))
+        await queue.start()
+        queue.submit("pepito out", MESSAGE, TARGETS)
+        while not queue.sender.sent:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)  # Let the flush loop journal the finished delivery
+        await crash(queue)
+
+    async def second_run():
+        queue = make_queue(tmp_path, FakeSender())
+        await queue.start()
+        batches = list(queue.batches.values())
+        assert [batch.remaining for batch in batches] == [2]
+        await asyncio.wait_for(batches[0].done.wait(), 1)
+        await queue.close()
+        return queue.sender.sent
+
+    asyncio.run(first_run())
+    assert sorted(asyncio.run(second_run())) == [20, 30]
+
+
+def test_cancelled_batch_is_not_resumed(tmp_path):
+    async def first_run():
+        queue = make_queue(tmp_path, FakeSender(hang={10, 20, 30}))
+        await queue.start()
+        batch = queue.submit("announcement", MESSAGE, TARGETS)
+        await asyncio.sleep(0.05)
+        queue.cancel(batch.id)
+        await asyncio.sleep(0.05)
+        await crash(queue)
+
+    async def second_run():
+        queue = make_queue(tmp_path, FakeSender())
+        await queue.start()
+        resumed = dict(queue.batches)
+        await queue.close()
+        return resumed
+
+    asyncio.run(first_run())
+    assert asyncio.run(second_run()) == {}
+
+
+def test_finished_queue_leaves_an_empty_journal(tmp_path):
+    async def run():
+        queue = make_queue(tmp_path, FakeSender())
+        await queue.start()
+        batch = queue.submit("pepito in", MESSAGE, TARGETS)
+        await asyncio.wait_for(batch.done.wait(), 1)
+        await queue.close()
+
+    asyncio.run(run())
+    assert (tmp_path / "queue.journal").read_text() == ""
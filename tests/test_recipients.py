@@ -0,0 +1,127 @@
+import asyncio
+import random
+
+from utils.recipients import BUCKET_SECONDS, RecipientIndex, is_quiet
+from utils.registry import GuildRegistry
+
+TIMEZONES = ["Europe/Oslo", "America/New_York", "Asia/Kolkata", "UTC"]
+
+
+def make_registry(tmp_path):
+    registry = GuildRegistry(str(tmp_path / "channels.json"), read_only=True)
+    registry.load()
+    return registry
+
+
+def every_target(index):
+    """All lookups an event can make, sorted so indexes can be compared."""
+    return {
+        (event_type, bucket): {timezone: sorted(channels) for timezone, channels in index.targets(event_type, bucket * BUCKET_SECONDS).items()}
+        for event_type in ("in", "out")
+        for bucket in range(0, 96, 3)
+    }
+
+
+def test_is_quiet_wraps_past_midnight():
+    assert is_quiet(23, [22, 7]) and is_quiet(3, [22, 7])
+    assert not is_quiet(12, [22, 7])
+    assert is_quiet(13, [12, 14]) and not is_quiet(14, [12, 14])
+    assert not is_quiet(3, None)
+
+
+def test_incremental_updates_match_a_rebuild(tmp_path):
+    rng = random.Random(7)
+
+    async def run():
+        registry = make_registry(tmp_path)
+        index = RecipientIndex(registry)
+        registry.on_change = index.guild_changed
+        for guild_id in range(200):
+            registry.set_channel(guild_id, "Guild", 1000 + guild_id)
+            registry.set_preferences(
+                guild_id, timezone=rng.choice(TIMEZONES), quiet_hours=rng.choice([None, [22, 7], [9, 17]]),
+                event_types=rng.choice([None, ["in"], ["out"]]),
+            )
+        index.rebuild()
+
+        for _ in range(300):
+            guild_id = rng.randrange(250)
+            action = rng.random()
+            if action < 0.3:
+                registry.set_channel(guild_id, "Guild", 5000 + guild_id)
+            elif action < 0.6:
+                registry.set_preferences(guild_id, timezone=rng.choice(TIMEZONES), quiet_hours=rng.choice([None, [1, 5]]))
+            elif action < 0.8:
+                registry.disable_channel(guild_id, "test")
+            else:
+                registry.remove_guild(guild_id)
+            if rng.random() < 0.1:
+                every_target(index)  # Apply some of the changes mid-way
+
+        rebuilt = RecipientIndex(registry)
+        rebuilt.rebuild()
+        return every_target(index), every_target(rebuilt)
+
+    incremental, rebuilt = asyncio.run(run())
+    assert incremental == rebuilt
+
+
+def test_changes_outside_subscriptions_do_not_reindex(tmp_path):
+    async def run():
+        registry = make_registry(tmp_path)
+        index = RecipientIndex(registry)
+        registry.on_change = index.guild_changed
+        registry.set_channel(1, "One", 10, webhook=(5, "token"))
+        index.rebuild()
+        registry.add_guild(2, "Two")
+        registry.forget_webhook(10)
+        return index.changed
+
+    assert asyncio.run(run()) == set()
+
+
+def test_reload_reports_only_changed_guilds(tmp_path):
+    path = str(tmp_path / "channels.json")
+
+    async def run():
+        writer = GuildRegistry(path)
+        writer.load()
+        for guild_id in range(5):
+            writer.set_channel(guild_id, "Guild", 100 + guild_id)
+        await writer.flush()
+
+        reader = GuildRegistry(path, read_only=True)
+        reader.load()
+        changed = []
+        reader.on_change = changed.append
+        reader.load()
+        unchanged = list(changed)
+
+        writer.set_preferences(2, timezone="UTC")
+        writer.add_guild(9, "Nine")
+        writer.disable_channel(3, "test")
+        await writer.flush()
+        reader.load()
+        return unchanged, sorted(changed)
+
+    assert asyncio.run(run()) == ([], ["2", "3"])
+
+
+def test_quiet_hours_follow_daylight_saving(tmp_path):
+    async def run():
+        registry = make_registry(tmp_path)
+        index = RecipientIndex(registry, recheck_every=0)
+        registry.on_change = index.guild_changed
+        registry.set_channel(1, "One", 10)
+        registry.set_preferences(1, timezone="Europe/Oslo", quiet_hours=[0, 6])
+        bucket = 18  # 04:30 UTC: 05:30 in Oslo in winter (quiet), 06:30 in summer (awake)
+
+        def awake():
+            return (10, "1") in index.groups.get((None, bucket), {}).get("Europe/Oslo", {})
+
+        index.update(1_704_067_200)  # 2024-01-01, Oslo is UTC+1
+        in_winter = awake()
+        index.update(1_719_792_000)  # 2024-07-01, Oslo is UTC+2
+        return in_winter, awake()
+
+    assert asyncio.run(run()) == (False, True)
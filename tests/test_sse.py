@@ -0,0 +1,25 @@
+import json
+
+from utils.sse import SSEDecoder
+
+
+def test_reset_drops_partial_event():
+    decoder = SSEDecoder()
+    assert decoder.feed(b'id: 7\ndata: {"a":1}\n') == []
+
+    decoder.reset()  # The connection dropped mid-event
+    events = decoder.feed(b'data: {"b":2}\n\n')
+
+    assert len(events) == 1
+    assert json.loads(events[0].data) == {"b": 2}
+    assert decoder.last_event_id == "7"  # Still sent as Last-Event-ID on reconnect
+
+
+def test_reset_drops_partial_event_name():
+    decoder = SSEDecoder()
+    decoder.feed(b"event: stale\ndata: x")
+
+    decoder.reset()
+    events = decoder.feed(b"data: y\n\n")
+
+    assert [(event.event, event.data) for event in events] == [("message", "y")]
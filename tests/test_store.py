@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+from utils.registry import GuildRegistry
+from utils.store import SubscriptionStore
+
+
+def test_journal_replays_over_snapshot(tmp_path):
+    path = tmp_path / "channels.json"
+    path.write_text(json.dumps({"1": {"server_name": "One"}, "2": {"server_name": "Two"}}))
+    store = SubscriptionStore(str(path))
+
+    store.append([
+        SubscriptionStore.set_record("1", {"server_name": "One", "channel_id": "10"}),
+        SubscriptionStore.delete_record("2"),
+        SubscriptionStore.set_record("3", {"server_name": "Three"}),
+    ])
+
+    assert SubscriptionStore(str(path)).load() == {
+        "1": {"server_name": "One", "channel_id": "10"},
+        "3": {"server_name": "Three"},
+    }
+
+
+def test_partial_last_journal_line_is_skipped(tmp_path):
+    path = tmp_path / "channels.json"
+    store = SubscriptionStore(str(path))
+    store.append([SubscriptionStore.set_record("1", {"server_name": "One"})])
+    with open(store.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"op": "set", "guild_id": "2", "in')  # Crash mid-append
+
+    reloaded = SubscriptionStore(str(path))
+    assert reloaded.load() == {"1": {"server_name": "One"}}
+    assert reloaded.journal_entries == 1
+
+
+def test_compact_replaces_snapshot_and_empties_journal(tmp_path):
+    path = tmp_path / "channels.json"
+    store = SubscriptionStore(str(path))
+    store.append([SubscriptionStore.set_record("1", {"server_name": "One"})])
+
+    store.compact(json.dumps({"1": {"server_name": "One"}}))
+
+    assert store.journal_entries == 0
+    assert (tmp_path / "channels.json.journal").read_text() == ""
+    assert not (tmp_path / "channels.json.tmp").exists()
+    assert SubscriptionStore(str(path)).load() == {"1": {"server_name": "One"}}
+
+
+def test_crash_between_snapshot_and_journal_truncation(tmp_path):
+    path = tmp_path / "channels.json"
+    store = SubscriptionStore(str(path))
+    store.append([
+        SubscriptionStore.set_record("1", {"server_name": "One"}),
+        SubscriptionStore.delete_record("2"),
+    ])
+    # The new snapshot is in place but the journal still holds the changes it contains
+    path.write_text(json.dumps({"1": {"server_name": "One"}}))
+
+    assert SubscriptionStore(str(path)).load() == {"1": {"server_name": "One"}}
+
+
+def test_registry_changes_survive_reload_and_compaction(tmp_path):
+    path = str(tmp_path / "channels.json")
+
+    async def update():
+        registry = GuildRegistry(path, compact_after=3)
+        registry.load()
+        registry.set_channel(1, "One", 10)
+        registry.set_channel(2, "Two", 20)
+        registry.set_preferences(1, timezone="UTC")
+        registry.remove_guild(2)
+        await registry.flush()  # Four records, past compact_after
+        registry.add_guild(3, "Three")
+        await registry.flush()
+        return registry
+
+    registry = asyncio.run(update())
+    assert registry.store.journal_entries == 1
+
+    reloaded = GuildRegistry(path)
+    reloaded.load()
+    assert reloaded.guilds == registry.guilds
+    assert reloaded.subscriptions == {"1": 10}
+    assert reloaded.preferences(1) == {"timezone": "UTC"}
@@ -0,0 +1,31 @@
+import random
+
+
+class Backoff:
+    """Jittered exponential backoff.
+
+    Each call to next() returns a delay between half and all of
+    base * factor ** attempts (capped at `maximum`), so reconnecting
+    clients do not retry in lockstep.
+    """
+
+    def __init__(self, base=1.0, maximum=60.0, factor=2.0):
+        self.base = base
+        self.maximum = maximum
+        self.factor = factor
+        self.attempts = 0
+
+    def delay(self, attempts):
+        """Return a jittered delay for the given number of previous attempts."""
+        delay = min(self.maximum, self.base * self.factor ** attempts)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def next(self):
+        """Return the delay to wait before the next attempt."""
+        delay = self.delay(self.attempts)
+        self.attempts += 1
+        return delay
+
+    def reset(self):
+        """Start over after a successful attempt."""
+        self.attempts = 0
@@ -0,0 +1,31 @@
+import hashlib
+import json
+import os
+
+
+def command_fingerprint(bot):
+    """Hash the application's global slash-command schema."""
+    commands = sorted(
+        (command.to_dict(bot.tree) for command in bot.tree.get_commands()),
+        key=lambda command: (command["type"], command["name"]),
+    )
+    schema = json.dumps({"application_id": bot.application_id, "commands": commands}, sort_keys=True)
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()
+
+
+async def sync_commands(bot, path="command_sync.hash", force=False):
+    """Sync the global slash commands unless they match the last synced schema.
+
+    The hash of the last schema Discord accepted is kept in `path`, so restarts
+    with unchanged commands skip the sync API call. Returns True if commands were synced.
+    """
+    fingerprint = command_fingerprint(bot)
+    if not force and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read().strip() == fingerprint:
+                return False
+
+    await bot.tree.sync()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(fingerprint)
+    return True
@@ -0,0 +1,36 @@
+import time
+from collections import OrderedDict
+
+
+class EventDeduplicator:
+    """Remember recently seen event keys to drop repeats.
+
+    Keys are kept for `ttl` seconds after they were first seen, and only the
+    `max_size` newest ones are remembered, so memory stays bounded however
+    long the bot runs. Seeing a key again doesn't extend its lifetime.
+    """
+
+    def __init__(self, max_size=1024, ttl=86400.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.seen = OrderedDict()  # key -> time.monotonic() it was first seen, oldest first
+
+    def __len__(self):
+        return len(self.seen)
+
+    def check(self, key):
+        """Return True if `key` was seen within the TTL, otherwise remember it and return False."""
+        now = time.monotonic()
+        while self.seen:
+            oldest, seen_at = next(iter(self.seen.items()))
+            if now - seen_at < self.ttl:
+                break
+            del self.seen[oldest]
+
+        # Keys stay in first-seen order, so the loop above drops every expired one
+        if key in self.seen:
+            return True
+        self.seen[key] = now
+        if len(self.seen) > self.max_size:
+            self.seen.popitem(last=False)
+        return False
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+import aiohttp
+import discord
+from discord.http import json_or_text
+
+from utils import metrics
+
+
+class TokenBucket:
+    """A simple token bucket allowing `rate` operations every `per` seconds."""
+
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+    def pause(self, seconds):
+        """Drain the bucket so nobody sends for the next `seconds` seconds."""
+        self.tokens = -seconds * self.rate / self.per
+        self.updated = time.monotonic()
+
+
+class LatencyTracker:
+    """Keep the most recent durations and report percentiles over them."""
+
+    def __init__(self, size=1000):
+        self.samples = deque(maxlen=size)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, pct):
+        """Return the nearest-rank percentile of the recorded samples, or None."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class RateLimitCounter(logging.Filter):
+    """Count the 429s discord.py handles by itself.
+
+    HTTPClient.request sleeps and retries a rate-limited request (or raises
+    RateLimited when the wait is too long) without raising to the caller, and
+    only logs a warning. Installed on the discord.http logger, this counts
+    those warnings; it needs that logger to be enabled for WARNING.
+    """
+
+    def filter(self, record):
+        if isinstance(record.msg, str) and record.msg.startswith("We are being rate limited."):
+            metrics.rate_limited.inc()
+        return True
+
+
+def count_discord_rate_limits():
+    """Install a RateLimitCounter on the discord.http logger once."""
+    logger = logging.getLogger("discord.http")
+    if not any(isinstance(f, RateLimitCounter) for f in logger.filters):
+        logger.addFilter(RateLimitCounter())
+
+
+class FanoutSender:
+    """Send the same message to many channels concurrently while respecting Discord's rate limits.
+
+    Messages are sent straight through the REST client by channel id, using
+    parameters prebuilt with utils.payloads, so neither the channel cache nor
+    per-channel serialization is involved. Many sends can be in flight at
+    once, up to `max_concurrency`; utils.delivery_queue drives it.
+
+    Discord allows roughly 50 requests per second per bot (the global bucket) and
+    5 messages every 5 seconds per channel (the per-route bucket for
+    POST /channels/{channel_id}/messages). Both are enforced locally so a
+    fan-out does not run into a wall of 429 responses.
+    """
+
+    def __init__(self, http, max_concurrency=None, global_rate=None, channel_rate=5, channel_per=5.0):
+        self.http = http  # The bot's discord.http.HTTPClient
+        self.max_concurrency = max_concurrency or int(os.getenv("FANOUT_CONCURRENCY", "25"))
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.global_bucket = TokenBucket(global_rate or int(os.getenv("FANOUT_GLOBAL_RATE", "45")), 1.0)
+        self.channel_rate = channel_rate
+        self.channel_per = channel_per
+        self.channel_buckets = {}
+        count_discord_rate_limits()
+
+    def _channel_bucket(self, channel_id):
+        bucket = self.channel_buckets.get(channel_id)
+        if bucket is None:
+            bucket = self.channel_buckets[channel_id] = TokenBucket(self.channel_rate, self.channel_per)
+        return bucket
+
+    async def send(self, channel_id, params):
+        """Send a single message, waiting for rate-limit budget.
+
+        Returns the created message as a dict. discord.py waits out and
+        retries Discord's own 429s; one that still gets here came without a
+        Via header (most likely Cloudflare blocking the bot), so every send
+        pauses for its Retry-After before the delivery queue retries.
+        """
+        bucket = self._channel_bucket(channel_id)
+        async with self.semaphore:
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                return await self.http.send_message(channel_id, params=params)
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    metrics.rate_limited.inc()
+                    try:
+                        retry_after = float(e.response.headers.get("Retry-After", 1))
+                    except ValueError:
+                        retry_after = 1.0
+                    self.global_bucket.pause(retry_after)
+                raise
+
+    async def close(self):
+        """Nothing to release, the REST client belongs to the bot."""
+
+
+class WebhookSender:
+    """Send messages through channel webhooks, falling back to `fallback` for channels without one.
+
+    Webhook executions are authorized by the webhook's own token rather than
+    the bot token, so they don't count against the bot's global rate limit and
+    every webhook has its own bucket (5 requests every 2 seconds). All requests
+    go over one keep-alive aiohttp session whose connection pool is sized to
+    `max_concurrency`, so no gateway connection or channel cache is needed.
+    """
+
+    def __init__(self, fallback, webhook_for, on_gone=None, max_concurrency=None, webhook_rate=5, webhook_per=2.0):
+        self.fallback = fallback  # Sender used for channels without a webhook, e.g. a FanoutSender
+        self.webhook_for = webhook_for  # channel_id -> (webhook_id, webhook_token) or None
+        self.on_gone = on_gone  # Called with the channel_id when its webhook was deleted
+        self.max_concurrency = max_concurrency or int(os.getenv("WEBHOOK_CONCURRENCY", "100"))
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.webhook_rate = webhook_rate
+        self.webhook_per = webhook_per
+        self.buckets = {}
+        self.session = None
+
+    def _session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30))
+        return self.session
+
+    async def close(self):
+        """Close the pooled session."""
+        if self.session is not None:
+            await self.session.close()
+        await self.fallback.close()
+
+    async def send(self, channel_id, params):
+        """Execute the channel's webhook with the message, or send it through the fallback sender."""
+        webhook = self.webhook_for(channel_id)
+        if webhook is None:
+            return await self.fallback.send(channel_id, params)
+
+        webhook_id, webhook_token = webhook
+        bucket = self.buckets.get(webhook_id)
+        if bucket is None:
+            bucket = self.buckets[webhook_id] = TokenBucket(self.webhook_rate, self.webhook_per)
+        # Route.BASE is read per request so a different API base (e.g. benchmarks.fake_discord) applies
+        url = f"{discord.http.Route.BASE}/webhooks/{webhook_id}/{webhook_token}"
+        async with self.semaphore:
+            for attempt in range(2):
+                await bucket.acquire()
+                async with self._session().post(url, json=params.payload) as response:
+                    if response.status < 300:
+                        return None
+                    data = await json_or_text(response)
+                if response.status == 429:
+                    metrics.rate_limited.inc()
+                    if not attempt:
+                        bucket.pause(data.get("retry_after", 1.0) if isinstance(data, dict) else 1.0)
+                        continue
+                elif response.status == 404 and self.on_gone is not None:
+                    # The webhook was deleted, deliver with the bot token from now on
+                    self.on_gone(channel_id)
+                    return await self.fallback.send(channel_id, params)
+                raise discord.HTTPException(response, data)
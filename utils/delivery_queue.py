@@ -0,0 +1,302 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+
+import aiohttp
+import discord
+from discord.http import MultipartParameters
+
+from utils import metrics
+from utils.backoff import Backoff
+from utils.delivery import LatencyTracker
+
+log = logging.getLogger(__name__)
+
+# Lower numbers are delivered first
+PRIORITY_EVENT = 0
+PRIORITY_ANNOUNCEMENT = 1
+PRIORITY_REMINDER = 2
+
+
+def is_transient(error):
+    """Return True if sending again later might succeed."""
+    if isinstance(error, discord.HTTPException):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, OSError))
+
+
+class DeliveryBatch:
+    """One message to be delivered to many channels."""
+
+    def __init__(self, batch_id, label, payload, targets, priority):
+        self.id = batch_id
+        self.label = label  # Shown in logs, e.g. "pepito in"
+        self.payload = payload  # JSON body of the message
+        self.params = MultipartParameters(payload=payload, multipart=None, files=None)
+        self.priority = priority
+        self.pending = dict(targets)  # channel_id -> guild_id still to deliver
+        self.total = len(self.pending)
+        self.sent = 0
+        self.dead = []  # (guild_id, channel_id, error) for permanently failed deliveries
+        self.started = time.perf_counter()
+        self.first_sent = None  # Seconds from submit to the first delivered message
+        self.duration = None
+        self.cancelled = False
+        self.done = asyncio.Event()
+
+    @property
+    def remaining(self):
+        return len(self.pending)
+
+
+class DeliveryQueue:
+    """Persistent queue of (message, channel) delivery jobs drained by worker tasks.
+
+    Submitting a batch only records it; workers deliver it through the shared
+    FanoutSender once its record is on disk, which the flush loop does right
+    away. Every batch and every finished delivery is written to an
+    append-only journal, so after a restart the queue resumes with whatever
+    was still pending (deliveries are at-least-once: a crash may repeat the
+    last few). Transient errors are retried with backoff; permanent errors
+    and exhausted retries go to a dead-letter file.
+
+    `on_result(guild_id, channel_id, error)` is called after every delivery
+    that succeeded (error is None) or failed permanently.
+    """
+
+    def __init__(self, sender, path="delivery_queue.journal", dead_letter_path="dead_letters.jsonl",
+                 workers=None, max_attempts=5, flush_interval=0.5, compact_after=50000, on_result=None):
+        self.sender = sender
+        self.on_result = on_result
+        self.path = path
+        self.dead_letter_path = dead_letter_path
+        self.workers = workers or sender.max_concurrency
+        self.max_attempts = max_attempts
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after  # Rewrite the journal once it has this many lines
+        self.backoff = Backoff(base=2.0, maximum=120.0)
+        self.batches = {}  # batch_id -> DeliveryBatch, unfinished batches only
+        self.latency = LatencyTracker()  # Time from submit to the last delivery of a batch
+        self.queue = asyncio.PriorityQueue()
+        self._order = itertools.count()  # Keeps FIFO order within a priority
+        self._records = []  # Journal records not yet written
+        self._dead_letters = []  # Dead-letter records not yet written
+        self._waiting = []  # Submitted batches whose record isn't on disk yet, enqueued once it is
+        self._wakeup = asyncio.Event()  # Set to flush without waiting for flush_interval
+        self._journal_lines = 0
+        self._write_lock = asyncio.Lock()
+        self._tasks = []
+        metrics.delivery_queue_depth.function = self.queue.qsize
+
+    async def start(self):
+        """Resume pending deliveries from the journal and start the workers. Safe to call twice."""
+        if self._tasks:
+            return
+        for batch in await asyncio.to_thread(self._load):
+            self._enqueue(batch, batch.pending)
+            log.info("Resuming delivery of %s to %d channels.", batch.label, batch.remaining)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._flush_loop()))
+
+    async def close(self):
+        """Stop the workers and write everything recorded so far."""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        await self._flush()
+
+    def submit(self, label, params, targets, priority=PRIORITY_EVENT):
+        """Queue `params` (prebuilt message parameters) for every (channel_id, guild_id) in `targets`.
+
+        Returns the DeliveryBatch straight away; wait on batch.done to know when it finished.
+        """
+        batch = DeliveryBatch(uuid.uuid4().hex, label, params.payload, targets, priority)
+        self.batches[batch.id] = batch
+        self._records.append({
+            "op": "batch", "batch": batch.id, "label": label, "priority": priority,
+            "payload": batch.payload, "targets": list(batch.pending.items()),
+        })
+        if not batch.pending:
+            self._complete(batch)
+            return batch
+        # Sending before the batch is journaled would lose the rest of it in a crash
+        self._waiting.append(batch)
+        self._wakeup.set()
+        return batch
+
+    def cancel(self, batch_id):
+        """Drop the undelivered part of a batch. Returns the batch, or None if unknown."""
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        batch.cancelled = True
+        self._records.append({"op": "cancel", "batch": batch.id})
+        self._complete(batch)
+        return batch
+
+    def _enqueue(self, batch, channel_ids, attempt=0):
+        for channel_id in channel_ids:
+            self.queue.put_nowait((batch.priority, next(self._order), batch, channel_id, attempt))
+
+    async def _worker(self):
+        while True:
+            _, _, batch, channel_id, attempt = await self.queue.get()
+            if batch.cancelled or channel_id not in batch.pending:
+                continue
+            try:
+                await self.sender.send(channel_id, batch.params)
+            except Exception as e:
+                metrics.send_failures.inc()
+                if is_transient(e) and attempt + 1 < self.max_attempts:
+                    metrics.send_retries.inc()
+                    # Put the job back once the backoff delay has passed
+                    asyncio.get_running_loop().call_later(
+                        self.backoff.delay(attempt), self._enqueue, batch, (channel_id,), attempt + 1
+                    )
+                    continue
+                self._finish(batch, channel_id, e)
+            else:
+                self._finish(batch, channel_id)
+
+    def _finish(self, batch, channel_id, error=None):
+        guild_id = batch.pending.pop(channel_id)
+        self._records.append({"op": "done", "batch": batch.id, "channel": channel_id})
+        if error is None:
+            batch.sent += 1
+            metrics.messages_sent.inc()
+            metrics.send_rate.mark()
+            if batch.first_sent is None:
+                batch.first_sent = time.perf_counter() - batch.started
+                if batch.priority == PRIORITY_EVENT:
+                    metrics.event_first_send.observe(batch.first_sent)
+        else:
+            batch.dead.append((guild_id, channel_id, error))
+            metrics.dead_letters.inc()
+            self._dead_letters.append({
+                "time": datetime.utcnow().isoformat(), "batch": batch.id, "label": batch.label,
+                "guild_id": guild_id, "channel_id": channel_id, "error": str(error),
+            })
+        # Only permanent failures say something about the channel itself
+        if self.on_result is not None and (error is None or not is_transient(error)):
+            self.on_result(guild_id, channel_id, error)
+        if not batch.pending:
+            self._complete(batch)
+
+    def _complete(self, batch):
+        if batch.done.is_set():
+            return
+        batch.duration = time.perf_counter() - batch.started
+        self.batches.pop(batch.id, None)
+        if batch.total and not batch.cancelled:
+            self.latency.record(batch.duration)
+            if batch.priority == PRIORITY_EVENT:
+                metrics.event_last_send.observe(batch.duration)
+        batch.done.set()
+        if batch.total:
+            # One record per fan-out, individual sends are not logged
+            errors = {}
+            for _, _, error in batch.dead:
+                kind = type(error).__name__
+                errors[kind] = errors.get(kind, 0) + 1
+            log.info(
+                "Delivered %s to %d/%d channels in %.2fs.", batch.label, batch.sent, batch.total, batch.duration,
+                extra={
+                    "fields": {
+                        "batch": batch.id[:8], "sent": batch.sent, "failed": len(batch.dead), "total": batch.total,
+                        "cancelled": batch.cancelled, "duration": round(batch.duration, 3), "errors": errors,
+                        "p50": round(self.latency.percentile(50) or 0, 3),
+                        "p99": round(self.latency.percentile(99) or 0, 3),
+                    },
+                    # Rate limited per priority, so a stream of reminders can't hide event fan-outs
+                    "rate_limit_key": ("fan-out", batch.priority),
+                },
+            )
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Once started, a write must finish even if close() cancels this task
+            await asyncio.shield(self._flush())
+
+    async def _flush(self):
+        async with self._write_lock:
+            records, self._records = self._records, []
+            waiting, self._waiting = self._waiting, []
+            dead_letters, self._dead_letters = self._dead_letters, []
+            # With nothing left in flight the whole journal can be dropped,
+            # otherwise it is rewritten with only the pending work once it grows large
+            snapshot = None
+            if (not self.batches and (records or self._journal_lines)) or \
+                    self._journal_lines + len(records) > self.compact_after:
+                snapshot = self._snapshot()
+            if records or dead_letters or snapshot is not None:
+                await asyncio.to_thread(self._write, records, dead_letters, snapshot)
+            # These batches are journaled now, start delivering them unless cancelled meanwhile
+            for batch in waiting:
+                if not batch.cancelled:
+                    self._enqueue(batch, batch.pending)
+
+    def _snapshot(self):
+        """Return journal records describing only the unfinished batches."""
+        return [
+            {
+                "op": "batch", "batch": batch.id, "label": batch.label, "priority": batch.priority,
+                "payload": batch.payload, "targets": list(batch.pending.items()),
+            }
+            for batch in self.batches.values()
+        ]
+
+    def _write(self, records, dead_letters, snapshot):
+        if dead_letters:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(record) + "\n" for record in dead_letters)
+        if snapshot is not None:
+            # Rewrite the journal with only what is still pending, atomically
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(record) + "\n" for record in snapshot)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._journal_lines = len(snapshot)
+        elif records:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(record) + "\n" for record in records)
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_lines += len(records)
+
+    def _load(self):
+        """Rebuild the unfinished batches from the journal."""
+        batches = {}
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partial last line after a crash
+                self._journal_lines += 1
+                if record["op"] == "batch":
+                    batches[record["batch"]] = DeliveryBatch(
+                        record["batch"], record["label"], record["payload"],
+                        [tuple(target) for target in record["targets"]], record["priority"],
+                    )
+                elif record["op"] == "done" and record["batch"] in batches:
+                    batches[record["batch"]].pending.pop(record["channel"], None)
+                elif record["op"] == "cancel":
+                    batches.pop(record["batch"], None)
+        resumed = [batch for batch in batches.values() if batch.pending]
+        for batch in resumed:
+            self.batches[batch.id] = batch
+        return resumed
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+from collections import deque
+from datetime import datetime, timedelta
+from itertools import islice
+
+import pytz
+
+RECORD = struct.Struct("<IB")  # Unix time, index into EVENT_TYPES
+MAX_TIME = 2 ** 32 - 1  # Largest time a record can hold
+EVENT_TYPES = ("out", "in")
+
+log = logging.getLogger(__name__)
+
+
+class EventHistory:
+    """Append-only history of Pépito events with precomputed daily statistics.
+
+    Every event is appended to `path` as a fixed-size 5-byte record in time
+    order, so the file can be searched by time without an index. The most
+    recent `memory` events are kept in a ring buffer for /history. Per-day
+    rollups (trips, seconds outside) and running totals are updated as events
+    arrive and saved to `rollup_path`, so /stats never scans the history.
+
+    Recording an event only updates memory. Records and rollups are written
+    by a background thread a short while after the last event, so files are
+    never touched on the event loop.
+
+    Raw records older than `retention_days` are dropped from the file once a
+    day, and rollups older than `rollup_days` are forgotten, which bounds both
+    files however long the bot runs.
+    """
+
+    def __init__(self, path="history.bin", rollup_path=None, memory=1000, retention_days=30,
+                 rollup_days=3650, timezone="Europe/Oslo", save_delay=2.0):
+        self.path = path
+        self.rollup_path = rollup_path or f"{os.path.splitext(path)[0]}_rollups.json"
+        self.retention = timedelta(days=retention_days).total_seconds()
+        self.rollup_days = rollup_days
+        self.tz = pytz.timezone(timezone)
+        self.recent = deque(maxlen=memory)  # (time, type) of the latest events, oldest first
+        self.days = {}  # ISO date -> {"trips": ..., "outside": seconds}, oldest first
+        self.total_trips = 0
+        self.total_outside = 0.0
+        self.state = None  # "in" or "out" after the last event
+        self.state_since = None  # Time of the last event
+        self.last_time = 0
+        self.compacted_on = None  # Date of the last raw file compaction
+        self.save_delay = save_delay
+        self._pending = bytearray()  # Packed records not yet appended to the file
+        self._save_task = None
+        self._write_lock = asyncio.Lock()
+
+    def load(self):
+        """Load the rollups and the raw history, replaying events the rollups missed."""
+        if os.path.exists(self.rollup_path):
+            with open(self.rollup_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.days = data["days"]
+            self.state = data["state"]
+            self.state_since = data["state_since"]
+            self.last_time = data["last_time"]
+        self.total_trips = sum(day["trips"] for day in self.days.values())
+        self.total_outside = sum(day["outside"] for day in self.days.values())
+
+        replayed = False
+        for event_time, event_type in self.read():
+            self.recent.append((event_time, event_type))
+            # A crash between appending an event and saving the rollups leaves it unapplied
+            if event_time > self.last_time:
+                self._apply(event_time, event_type)
+                replayed = True
+        if replayed:
+            self._save_rollups(self._rollups_json())
+
+    def read(self, start=0):
+        """Yield (time, type) for every stored event at or after `start`."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset(f, start))
+            while True:
+                chunk = f.read(RECORD.size * 1024)
+                # A crash mid-append leaves a partial last record, ignore it
+                for offset in range(0, len(chunk) - RECORD.size + 1, RECORD.size):
+                    event_time, code = RECORD.unpack_from(chunk, offset)
+                    yield event_time, EVENT_TYPES[code]
+                if len(chunk) < RECORD.size * 1024:
+                    return
+
+    def _offset(self, f, start):
+        """Binary search the open history file for the first record at or after `start`."""
+        f.seek(0, os.SEEK_END)
+        low, high = 0, f.tell() // RECORD.size
+        while low < high:
+            middle = (low + high) // 2
+            f.seek(middle * RECORD.size)
+            if RECORD.unpack(f.read(RECORD.size))[0] < start:
+                low = middle + 1
+            else:
+                high = middle
+        return low * RECORD.size
+
+    def record(self, event_type, event_time):
+        """Store an event. Returns False for malformed or out-of-order events."""
+        if event_type not in EVENT_TYPES or not isinstance(event_time, (int, float)):
+            return False
+        if not 0 <= event_time <= MAX_TIME:
+            log.warning("Ignoring pepito %s event with an invalid time: %s", event_type, event_time)
+            return False
+        event_time = int(event_time)
+        if event_time < self.last_time:
+            log.warning("Ignoring out-of-order pepito %s event at %s.", event_type, event_time)
+            return False
+
+        self._pending += RECORD.pack(event_time, EVENT_TYPES.index(event_type))
+        self.recent.append((event_time, event_type))
+        self._apply(event_time, event_type)
+        self._schedule_save()
+        return True
+
+    def _schedule_save(self):
+        """Write the new records and rollups in the background, coalescing events close together."""
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.get_running_loop().create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(self.save_delay)
+        # Once started, a write must finish even if flush() cancels this task
+        await asyncio.shield(self._write())
+
+    async def _write(self):
+        async with self._write_lock:
+            if not self._pending:
+                return
+            records, self._pending = bytes(self._pending), bytearray()
+            rollups = self._rollups_json()
+            # Once a day, drop raw records past the retention period
+            cutoff = None
+            today = self.day_key(self.last_time)
+            if self.compacted_on != today:
+                self.compacted_on = today
+                cutoff = self.last_time - self.retention
+            await asyncio.to_thread(self._write_files, records, rollups, cutoff)
+
+    def _write_files(self, records, rollups, cutoff):
+        # Records go first: on load, events missing from the rollups are replayed from them
+        with open(self.path, "ab") as f:
+            f.write(records)
+        self._save_rollups(rollups)
+        if cutoff is not None:
+            self.compact(cutoff)
+
+    async def flush(self):
+        """Write any pending events immediately."""
+        if self._save_task is not None and not self._save_task.done():
+            self._save_task.cancel()
+        self._save_task = None
+        await self._write()
+
+    def _apply(self, event_time, event_type):
+        """Update the rollups and running totals with one event."""
+        if event_type == "out":
+            self._day(self.day_key(event_time))["trips"] += 1
+            self.total_trips += 1
+        elif self.state == "out" and self.state_since is not None:
+            self._add_outside(self.state_since, event_time)
+        self.state = event_type
+        self.state_since = event_time
+        self.last_time = event_time
+
+        # Forget the oldest rollups, days are stored in chronological order
+        while len(self.days) > self.rollup_days:
+            day = self.days.pop(next(iter(self.days)))
+            self.total_trips -= day["trips"]
+            self.total_outside -= day["outside"]
+
+    def _add_outside(self, start, end):
+        """Add the time between two events to the days it falls on."""
+        while start < end:
+            day_end = min(end, self.day_start(start) + timedelta(days=1).total_seconds())
+            self._day(self.day_key(start))["outside"] += day_end - start
+            self.total_outside += day_end - start
+            start = day_end
+
+    def _day(self, key):
+        day = self.days.get(key)
+        if day is None:
+            day = self.days[key] = {"trips": 0, "outside": 0.0}
+        return day
+
+    def day_key(self, timestamp):
+        """Return the local date of a Unix time as an ISO string."""
+        return datetime.fromtimestamp(timestamp, self.tz).date().isoformat()
+
+    def day_start(self, timestamp):
+        """Return the Unix time of local midnight on the day of `timestamp`."""
+        local = datetime.fromtimestamp(timestamp, self.tz)
+        midnight = self.tz.localize(datetime(local.year, local.month, local.day))
+        return midnight.timestamp()
+
+    def _rollups_json(self):
+        data = {"days": self.days, "state": self.state, "state_since": self.state_since, "last_time": self.last_time}
+        return json.dumps(data)
+
+    def _save_rollups(self, rollups):
+        tmp_path = f"{self.rollup_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(rollups)
+        os.replace(tmp_path, self.rollup_path)
+
+    def compact(self, cutoff):
+        """Drop raw records older than `cutoff` (a Unix time), they live on in the rollups."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            offset = self._offset(f, cutoff)
+            if offset == 0:
+                return
+            f.seek(offset)
+            tail = f.read()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(tail)
+        os.replace(tmp_path, self.path)
+        log.info("Compacted event history, dropped %d events older than the retention period.", offset // RECORD.size)
+
+    def last(self, count):
+        """Return the `count` most recent events as (time, type), newest first."""
+        return list(islice(reversed(self.recent), count))
+
+    def today(self, now):
+        """Return (trips, seconds outside) for the local day of `now`, counting an ongoing trip."""
+        day = self.days.get(self.day_key(now), {"trips": 0, "outside": 0.0})
+        outside = day["outside"]
+        if self.state == "out" and self.state_since is not None:
+            outside += max(0.0, now - max(self.state_since, self.day_start(now)))
+        return day["trips"], outside
+
+    def averages(self, now):
+        """Return (trips, seconds outside) per day since the first recorded day."""
+        if not self.days:
+            return 0.0, 0.0
+        first = datetime.fromisoformat(next(iter(self.days))).date()
+        days = (datetime.fromtimestamp(now, self.tz).date() - first).days + 1
+        return self.total_trips / days, self.total_outside / days
@@ -0,0 +1,163 @@
+import asyncio
+import hmac
+import ipaddress
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def parse_address(address):
+    """Split a "host:port" string into a (host, port) tuple."""
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def is_loopback(host):
+    """Return True if `host` only accepts connections from this machine."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class EventPublisher:
+    """Relay events from the process reading the SSE stream to other bot processes.
+
+    Subscribers connect over a local TCP socket and receive one JSON document
+    per line. A subscriber that stops reading is disconnected rather than
+    allowed to buffer without limit. Lines a subscriber sends back are handed
+    to `on_message`.
+
+    With a `secret`, a subscriber must send it as its first line before it
+    gets or sends anything. Without one, the relay only listens on loopback.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, max_buffer=1024 * 1024, on_message=None, secret=None,
+                 auth_timeout=5.0):
+        if not secret and not is_loopback(host):
+            raise ValueError(f"Refusing to relay events on {host} without EVENT_IPC_SECRET.")
+        self.host = host
+        self.port = port
+        self.max_buffer = max_buffer
+        self.on_message = on_message
+        self.secret = secret
+        self.auth_timeout = auth_timeout
+        self.writers = set()
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        log.info("Event relay listening on %s:%s", self.host, self.port)
+
+    async def _authenticate(self, reader):
+        if not self.secret:
+            return True
+        try:
+            line = await asyncio.wait_for(reader.readline(), timeout=self.auth_timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            return False
+        return hmac.compare_digest(line.rstrip(b"\r\n"), self.secret.encode("utf-8"))
+
+    async def _handle(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        if not await self._authenticate(reader):
+            log.warning("Rejected event relay connection from %s: wrong or missing secret.", peer)
+            writer.close()
+            return
+        self.writers.add(writer)
+        log.info("Event relay subscriber connected: %s", peer)
+        try:
+            # Runs until the subscriber disconnects
+            while line := await reader.readline():
+                await self._receive(line)
+        except ConnectionError:
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+            log.info("Event relay subscriber disconnected: %s", peer)
+
+    async def _receive(self, line):
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError as e:
+            log.warning("Dropping malformed line from an event relay subscriber: %s", e)
+            return
+        if self.on_message is None:
+            return
+        try:
+            await self.on_message(event)
+        except Exception as e:
+            log.exception("Error handling an event from a relay subscriber: %s", e)
+
+    def publish(self, event):
+        """Send an event to every connected subscriber."""
+        line = json.dumps(event).encode("utf-8") + b"\n"
+        for writer in list(self.writers):
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                log.warning("Dropping slow event relay subscriber: %s", writer.get_extra_info("peername"))
+                self.writers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+        for writer in list(self.writers):
+            writer.close()
+        self.writers.clear()
+
+
+class EventSubscriber:
+    """Receive events relayed by an EventPublisher and hand them to `callback`."""
+
+    def __init__(self, callback, host="127.0.0.1", port=8765, retry_delay=1.0, secret=None):
+        self.callback = callback
+        self.host = host
+        self.port = port
+        self.retry_delay = retry_delay
+        self.secret = secret  # Sent as the first line when the publisher requires one
+        self.writer = None  # Set while connected
+
+    def send(self, event):
+        """Send an event to the publisher, returning False when not connected."""
+        if self.writer is None or self.writer.is_closing():
+            return False
+        self.writer.write(json.dumps(event).encode("utf-8") + b"\n")
+        return True
+
+    async def run(self):
+        """Stay connected to the publisher until cancelled."""
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                log.info("Connected to event relay at %s:%s", self.host, self.port)
+                if self.secret:
+                    writer.write(self.secret.encode("utf-8") + b"\n")
+                self.writer = writer
+                try:
+                    while line := await reader.readline():
+                        await self._deliver(line)
+                finally:
+                    self.writer = None
+                    writer.close()
+                log.info("Event relay connection closed.")
+            except OSError as e:
+                log.warning("Error in event relay connection: %s", e)
+            await asyncio.sleep(self.retry_delay)
+
+    async def _deliver(self, line):
+        """Hand one relayed line to the callback; a bad line or a failing callback doesn't end the relay."""
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError as e:
+            log.warning("Dropping malformed event relay line: %s", e)
+            return
+        try:
+            await self.callback(event)
+        except Exception as e:
+            log.exception("Error handling relayed event: %s", e)
@@ -0,0 +1,124 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+
+class StructuredFormatter(logging.Formatter):
+    """Format records as `key=value` text or as one JSON object per line.
+
+    Structured fields are passed with `extra={"fields": {...}}` and appear
+    after the message, or under a "fields" key in JSON so they can't replace
+    the record's own time, level or message.
+    """
+
+    def __init__(self, json_lines=False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = getattr(record, "fields", None) or {}
+        if self.json_lines:
+            entry = {
+                "time": round(record.created, 3),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage(),
+            }
+            if fields:
+                entry["fields"] = fields
+            if record.exc_info:
+                entry["exception"] = self.formatException(record.exc_info)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most `burst` records with the same message template through every `interval` seconds.
+
+    Records are grouped by logger and unformatted message, so per-channel
+    lines like "Queued reminder for %s" count as one kind. A record can name
+    its own kind with `extra={"rate_limit_key": ...}`, so records that share
+    a template but not a source don't crowd each other out. The first record
+    after a quiet window says how many were dropped.
+    """
+
+    def __init__(self, burst=20, interval=60.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.windows = {}  # (logger, template or rate_limit_key) -> [window start, records seen]
+
+    def filter(self, record):
+        key = (record.name, getattr(record, "rate_limit_key", record.msg))
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[1] - self.burst if window is not None and window[1] > self.burst else 0
+            if len(self.windows) > 10000:
+                self.windows.clear()  # Bound memory if templates are built dynamically
+            self.windows[key] = [now, 1]
+            if suppressed:
+                record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+            return True
+        window[1] += 1
+        return window[1] <= self.burst
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """Queue records for the listener thread without formatting them first.
+
+    QueueHandler.prepare formats the record, folding the traceback into the
+    message and dropping exc_info, which would leave JSON lines without their
+    "exception" key. Only the message arguments are merged here, so they
+    can't change before the listener writes the record.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener = None
+
+
+def setup_logging(level=None):
+    """Send all logging through a queue to a background thread that writes to stdout.
+
+    The event loop only puts records on an in-memory queue, so a slow stdout
+    (a pipe, journald) never blocks it. LOG_LEVEL sets the level (default
+    INFO), LOG_FORMAT=json writes JSON lines, and LOG_RATE_LIMIT caps how many
+    records of one kind are written per minute (0 disables the cap).
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(StructuredFormatter(json_lines=os.getenv("LOG_FORMAT", "text") == "json"))
+    _listener = logging.handlers.QueueListener(queue.SimpleQueue(), stream, respect_handler_level=True)
+
+    handler = StructuredQueueHandler(_listener.queue)
+    burst = int(os.getenv("LOG_RATE_LIMIT", "20"))
+    if burst:
+        handler.addFilter(RateLimitFilter(burst=burst))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level or os.getenv("LOG_LEVEL", "INFO").upper())
+
+    _listener.start()
+    atexit.register(_listener.stop)
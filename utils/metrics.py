@@ -0,0 +1,153 @@
+"""Process-wide metrics for the notification pipeline.
+
+Metrics are plain module-level objects so any cog or helper can update them
+with an attribute increment and no locking; the HTTP server in
+utils.metrics_server reads them from its own thread.
+"""
+import bisect
+import time
+
+_metrics = []
+
+
+class Counter:
+    """A value that only goes up."""
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        _metrics.append(self)
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter", f"{self.name} {self.value}"]
+
+    def to_dict(self):
+        return self.value
+
+
+class Gauge:
+    """A value read from a function at scrape time."""
+
+    def __init__(self, name, help, function=None):
+        self.name = name
+        self.help = help
+        self.function = function
+        _metrics.append(self)
+
+    def get(self):
+        try:
+            return self.function() if self.function is not None else None
+        except Exception:
+            return None
+
+    def render(self):
+        value = self.get()
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {float(value)}"]
+
+    def to_dict(self):
+        return self.get()
+
+
+class Histogram:
+    """Counts observations into fixed buckets (upper bounds in seconds)."""
+
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        _metrics.append(self)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+    def to_dict(self):
+        return {"count": self.count, "sum": round(self.sum, 3), "buckets": dict(zip(map(str, self.buckets + ("+Inf",)), self.counts))}
+
+
+class RateMeter:
+    """Events per second over the last `window` seconds, kept in one-second slots."""
+
+    def __init__(self, window=60):
+        self.window = window
+        self.slots = [0] * window
+        self.stamps = [0] * window
+
+    def mark(self, amount=1):
+        second = int(time.monotonic())
+        index = second % self.window
+        if self.stamps[index] != second:
+            self.stamps[index] = second
+            self.slots[index] = 0
+        self.slots[index] += amount
+
+    def rate(self):
+        now = int(time.monotonic())
+        total = sum(count for count, stamp in zip(self.slots, self.stamps) if now - stamp < self.window)
+        return total / self.window
+
+
+def render_prometheus():
+    """Return every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def to_dict():
+    """Return every metric as a JSON-friendly dict."""
+    return {metric.name: metric.to_dict() for metric in _metrics}
+
+
+# SSE ingestion (APIConnectionCog)
+events_received = Counter("pepito_sse_events_received_total", "Events received from the Pépito SSE stream.")
+sse_lag = Histogram("pepito_sse_lag_seconds", "Time between an event's timestamp and its arrival over SSE.")
+sse_reconnects = Counter("pepito_sse_reconnects_total", "Reconnections to the Pépito SSE stream.")
+sse_demotions = Counter("pepito_sse_demotions_total", "SSE sources disconnected for trailing the fastest source.")
+sse_stalls = Counter("pepito_sse_stalls_total", "SSE connections dropped by the watchdog for going quiet.")
+
+sse_connected = Gauge("pepito_sse_connected", "1 while the SSE stream is connected.")
+sse_since_last_byte = Gauge("pepito_sse_seconds_since_last_byte", "Seconds since the SSE stream last sent anything.")
+
+# Pépito event fan-out (PepitoEventsCog, delivery queue)
+events_duplicate = Counter("pepito_events_duplicate_total", "Events dropped because the same event was already handled.")
+events_coalesced = Counter("pepito_events_coalesced_total", "Events merged into a later event within the coalescing window.")
+delivery_queue_depth = Gauge("pepito_delivery_queue_depth", "Delivery jobs waiting for a worker.")
+event_first_send = Histogram("pepito_event_first_send_seconds", "Time from receiving an event to its first delivered message.")
+event_last_send = Histogram("pepito_event_last_send_seconds", "Time from receiving an event to its last delivered message.")
+
+# Sends (FanoutSender, delivery queue)
+messages_sent = Counter("discord_messages_sent_total", "Messages delivered to Discord channels.")
+send_rate = RateMeter()
+send_failures = Counter("discord_send_failures_total", "Failed message sends, including ones retried later.")
+send_retries = Counter("discord_send_retries_total", "Message sends scheduled for a retry.")
+dead_letters = Counter("discord_dead_letters_total", "Deliveries given up on and written to the dead-letter file.")
+rate_limited = Counter("discord_rate_limited_total", "429 responses received from Discord.")
+sends_per_second = Gauge("discord_messages_sent_per_second", "Messages delivered per second over the last minute.", send_rate.rate)
+
+# Announcements and reminders (AnnounceCog, ReminderCog)
+announcements = Counter("pepito_announcements_total", "Global announcements started.")
+reminders_sent = Counter("pepito_reminders_total", "Reminders queued for servers without a notification channel.")
@@ -0,0 +1,46 @@
+import logging
+import threading
+
+from flask import Flask, Response, jsonify
+from werkzeug.serving import make_server
+
+from utils import metrics
+
+log = logging.getLogger(__name__)
+
+
+def create_app(health):
+    """Build the Flask app serving /metrics (Prometheus text) and /health (JSON).
+
+    `health` is a function returning a dict describing the bot; /health
+    answers 503 when its "ok" entry is false.
+    """
+    app = Flask("pepito-metrics")
+
+    @app.get("/metrics")
+    def prometheus():
+        return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    @app.get("/metrics.json")
+    def metrics_json():
+        return jsonify(metrics.to_dict())
+
+    @app.get("/health")
+    def health_check():
+        status = health()
+        return jsonify(status), 200 if status.get("ok") else 503
+
+    return app
+
+
+def start_metrics_server(health, host="127.0.0.1", port=8090):
+    """Serve the metrics app from a daemon thread. Returns the server, or None if it could not start."""
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # Don't log every scrape
+    try:
+        server = make_server(host, port, create_app(health), threaded=True)
+    except OSError as e:
+        log.error("Failed to start metrics server on %s:%s: %s", host, port, e)
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    log.info("Serving metrics on http://%s:%s/metrics", host, port)
+    return server
@@ -0,0 +1,38 @@
+from discord.http import MultipartParameters
+
+
+def embed_payload(embed):
+    """Render an embed to the request parameters of a message, once.
+
+    The result can be passed to FanoutSender for any number of channels
+    without being serialized again.
+    """
+    return MultipartParameters(payload={"embeds": [embed.to_dict()]}, multipart=None, files=None)
+
+
+class EmbedTemplate:
+    """An embed rendered once whose description is filled in per recipient.
+
+    The description may contain str.format placeholders, e.g. "Hello <@{owner_id}>".
+    render() only formats that string and copies the top-level dict.
+    """
+
+    def __init__(self, embed):
+        self.data = embed.to_dict()
+        self.description = self.data.get("description", "")
+
+    def render(self, **values):
+        data = dict(self.data)
+        data["description"] = self.description.format(**values)
+        return MultipartParameters(payload={"embeds": [data]}, multipart=None, files=None)
+
+
+_templates = {}
+
+
+def get_template(name, build_embed):
+    """Return the cached EmbedTemplate called `name`, building it with `build_embed()` on first use."""
+    template = _templates.get(name)
+    if template is None:
+        template = _templates[name] = EmbedTemplate(build_embed())
+    return template
@@ -0,0 +1,34 @@
+import os
+
+import discord
+
+
+def client_options(profile=None):
+    """Return the keyword arguments for the bot's client for a startup profile.
+
+    The "lean" profile (the default) only asks Discord for guild events, which
+    is everything the cogs use: guild joins/removals, channels and slash
+    command interactions (interactions need no intent). Members and presences
+    are neither requested nor cached and guilds are not chunked at startup, so
+    memory stays proportional to the number of guilds instead of their
+    members. The "full" profile restores discord.Intents.all().
+
+    MESSAGE_CACHE_SIZE sets how many messages discord.py keeps; the lean
+    profile keeps none by default since no cog reads messages.
+    """
+    profile = profile or os.getenv("BOT_PROFILE", "lean")
+    if profile == "full":
+        return {"intents": discord.Intents.all()}
+    if profile != "lean":
+        raise ValueError(f"Unknown bot profile: {profile}")
+
+    intents = discord.Intents.none()
+    intents.guilds = True  # Guild joins/removals, channel lists and permissions
+
+    max_messages = int(os.getenv("MESSAGE_CACHE_SIZE", "0")) or None
+    return {
+        "intents": intents,
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+        "chunk_guilds_at_startup": False,
+        "max_messages": max_messages,
+    }
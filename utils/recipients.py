@@ -0,0 +1,135 @@
+import time
+from datetime import datetime
+
+import pytz
+
+BUCKET_SECONDS = 15 * 60  # Every timezone's UTC offset is a multiple of 15 minutes
+BUCKETS = 24 * 3600 // BUCKET_SECONDS
+DEFAULT_TIMEZONE = "Europe/Oslo"
+
+
+def is_quiet(hour, quiet_hours):
+    """Return True if a local hour falls in quiet hours given as [start, end) hours, possibly past midnight."""
+    if not quiet_hours:
+        return False
+    start, end = quiet_hours
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class RecipientIndex:
+    """Channels that want an event, precomputed by event type and time of day.
+
+    Guilds are grouped by their event type filter (None for every type) and,
+    for guilds with quiet hours, by each 15-minute bucket of the UTC day in
+    which they are awake. Each group is split by display timezone, so an event
+    touches only the groups for its type and bucket and the embed is rendered
+    once per timezone.
+
+    The registry reports each guild whose channel or preferences change
+    through guild_changed(), and only that guild is reindexed at the next
+    lookup. Every hour the UTC offsets of the timezones with quiet hours are
+    checked, and guilds in a timezone whose offset moved (daylight saving)
+    are reindexed.
+    """
+
+    def __init__(self, registry, include=None, recheck_every=3600.0):
+        self.registry = registry
+        self.include = include  # guild_id -> bool, e.g. to skip guilds served by other shards
+        self.recheck_every = recheck_every
+        # (event type or None, bucket or None) -> {timezone: {(channel_id, guild_id): None}}
+        self.groups = {}
+        self.entries = {}  # guild_id -> (timezone, (channel_id, guild_id), group keys) it is indexed under
+        self.offsets = {}  # timezone -> UTC offset in minutes its quiet hours were bucketed with
+        self.changed = set()  # Guilds to reindex at the next lookup
+        self.built = False
+        self.checked = 0.0
+
+    def guild_changed(self, guild_id):
+        """Mark a guild for reindexing, or the whole index when guild_id is None."""
+        if guild_id is None:
+            self.built = False
+        else:
+            self.changed.add(str(guild_id))
+
+    def rebuild(self, now=None):
+        """Index every subscribed guild from scratch."""
+        now = time.time() if now is None else now
+        self.groups, self.entries, self.offsets = {}, {}, {}
+        self.changed.clear()
+        for guild_id in self.registry.subscriptions:
+            self._add(guild_id, now)
+        self.built = True
+        self.checked = now
+
+    def update(self, now=None):
+        """Reindex the guilds that changed, and the ones whose timezone changed its UTC offset."""
+        now = time.time() if now is None else now
+        if not self.built:
+            self.rebuild(now)
+            return
+        if now - self.checked >= self.recheck_every:
+            self.checked = now
+            for timezone, offset in list(self.offsets.items()):
+                if self._utc_offset(timezone, now) != offset:
+                    del self.offsets[timezone]
+                    self.changed.update(guild_id for guild_id, entry in self.entries.items() if entry[0] == timezone)
+        for guild_id in self.changed:
+            self._remove(guild_id)
+            self._add(guild_id, now)
+        self.changed.clear()
+
+    @staticmethod
+    def _utc_offset(timezone, now):
+        utc_offset = datetime.fromtimestamp(now, pytz.timezone(timezone)).utcoffset()
+        return int(utc_offset.total_seconds() // 60)
+
+    def _add(self, guild_id, now):
+        channel_id = self.registry.subscriptions.get(guild_id)
+        if channel_id is None or (self.include is not None and not self.include(guild_id)):
+            return
+        preferences = self.registry.preferences(guild_id)
+        timezone = preferences.get("timezone") or DEFAULT_TIMEZONE
+        quiet_hours = preferences.get("quiet_hours")
+        types = preferences.get("event_types") or [None]
+        if quiet_hours:
+            offset = self.offsets.get(timezone)
+            if offset is None:
+                offset = self.offsets[timezone] = self._utc_offset(timezone, now)
+            buckets = [
+                bucket for bucket in range(BUCKETS)
+                if not is_quiet((bucket * BUCKET_SECONDS // 60 + offset) % 1440 // 60, quiet_hours)
+            ]
+        else:
+            buckets = [None]
+        target = (channel_id, guild_id)
+        keys = [(event_type, bucket) for event_type in types for bucket in buckets]
+        for key in keys:
+            self.groups.setdefault(key, {}).setdefault(timezone, {})[target] = None
+        self.entries[guild_id] = (timezone, target, keys)
+
+    def _remove(self, guild_id):
+        entry = self.entries.pop(guild_id, None)
+        if entry is None:
+            return
+        timezone, target, keys = entry
+        for key in keys:
+            group = self.groups[key]
+            channels = group[timezone]
+            del channels[target]
+            if not channels:
+                del group[timezone]
+                if not group:
+                    del self.groups[key]
+
+    def targets(self, event_type, timestamp=None):
+        """Return {timezone: [(channel_id, guild_id)]} of the channels that want an event now."""
+        now = time.time()
+        self.update(now)
+        bucket = int((now if timestamp is None else timestamp) // BUCKET_SECONDS) % BUCKETS
+        targets = {}
+        for key in ((None, None), (event_type, None), (None, bucket), (event_type, bucket)):
+            for timezone, channels in self.groups.get(key, {}).items():
+                targets.setdefault(timezone, []).extend(channels)
+        return targets
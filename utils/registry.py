@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+
+from utils.store import SubscriptionStore
+
+log = logging.getLogger(__name__)
+
+# Per-guild notification preferences kept in a guild's entry, see set_preferences()
+PREFERENCE_KEYS = ("event_types", "quiet_hours", "timezone")
+
+
+def _preferences(info):
+    info = info or {}
+    return {key: info[key] for key in PREFERENCE_KEYS if key in info}
+
+
+class GuildRegistry:
+    """In-memory view of the channels database shared by all cogs.
+
+    The database is read once at startup. Lookups and updates only touch the
+    in-memory maps. Each change is recorded as a single journal entry which is
+    appended to disk in the background a short while after the last update, and
+    the journal is folded into a new snapshot once it grows past
+    `compact_after` entries.
+    """
+
+    def __init__(self, path="channels.json", save_delay=2.0, compact_after=500, failure_limit=3, read_only=False):
+        self.store = SubscriptionStore(path)
+        self.read_only = read_only  # Keep changes in memory only, another process owns the database
+        self.save_delay = save_delay
+        self.compact_after = compact_after
+        self.failure_limit = failure_limit  # Consecutive failed deliveries before a channel is disabled
+        self.failures = {}  # guild_id (str) -> consecutive failed deliveries, only guilds currently failing
+        self.on_disable = None  # Called with the guild_id when a channel gets disabled
+        self.on_change = None  # Called with the guild_id when a guild's channel or preferences change
+        self.guilds = {}  # guild_id (str) -> {"server_name": ..., "channel_id": ...}
+        self.subscriptions = {}  # guild_id (str) -> channel_id (int), only guilds with a channel set
+        self.webhooks = {}  # channel_id (int) -> (webhook_id, webhook_token), only channels with a webhook
+        self._pending = []  # Change records not yet written to the journal
+        self._save_task = None
+        self._write_lock = asyncio.Lock()
+
+    def load(self):
+        """Load the database from disk, replacing the in-memory state."""
+        data = self.store.load()
+        old_guilds, old_subscriptions = self.guilds, self.subscriptions
+        self.guilds = data
+        self.subscriptions = {
+            guild_id: int(info["channel_id"])
+            for guild_id, info in data.items()
+            if "channel_id" in info
+        }
+        self.webhooks = {
+            int(info["channel_id"]): (info["webhook_id"], info["webhook_token"])
+            for info in data.values()
+            if "channel_id" in info and "webhook_id" in info
+        }
+
+        # Report only the guilds whose channel or preferences differ from before the reload
+        if self.on_change is not None:
+            for guild_id in old_subscriptions.keys() | self.subscriptions.keys():
+                if (old_subscriptions.get(guild_id) != self.subscriptions.get(guild_id)
+                        or _preferences(old_guilds.get(guild_id)) != _preferences(data.get(guild_id))):
+                    self.on_change(guild_id)
+
+    def get(self, guild_id):
+        """Return the stored info for a guild, or None."""
+        return self.guilds.get(str(guild_id))
+
+    def __contains__(self, guild_id):
+        return str(guild_id) in self.guilds
+
+    def __len__(self):
+        return len(self.guilds)
+
+    def is_subscribed(self, guild_id):
+        """Return True if the guild has a notification channel set."""
+        return str(guild_id) in self.subscriptions
+
+    def server_name(self, guild_id):
+        """Return the stored name of a guild for log messages."""
+        info = self.guilds.get(str(guild_id)) or {}
+        return info.get("server_name", f"Unknown Guild (ID: {guild_id})")
+
+    def add_guild(self, guild_id, server_name):
+        """Add a guild without a channel. Returns False if it was already known."""
+        guild_id = str(guild_id)
+        if guild_id in self.guilds:
+            return False
+        self.guilds[guild_id] = {"server_name": server_name}
+        self.schedule_save(SubscriptionStore.set_record(guild_id, self.guilds[guild_id]))
+        return True
+
+    def webhook_for(self, channel_id):
+        """Return (webhook_id, webhook_token) of a notification channel, or None."""
+        return self.webhooks.get(channel_id)
+
+    def set_channel(self, guild_id, server_name, channel_id, webhook=None):
+        """Set (or replace) the notification channel of a guild, and optionally its (webhook_id, webhook_token)."""
+        guild_id = str(guild_id)
+        old_channel = self.subscriptions.get(guild_id)
+        if old_channel is not None:
+            self.webhooks.pop(old_channel, None)
+        info = {
+            "server_name": server_name,
+            "channel_id": str(channel_id)
+        }
+        # Preferences stay when the channel changes
+        old_info = self.guilds.get(guild_id) or {}
+        info.update({key: old_info[key] for key in PREFERENCE_KEYS if key in old_info})
+        if webhook is not None:
+            info["webhook_id"], info["webhook_token"] = str(webhook[0]), webhook[1]
+            self.webhooks[int(channel_id)] = (info["webhook_id"], info["webhook_token"])
+        self.guilds[guild_id] = info
+        self.subscriptions[guild_id] = int(channel_id)
+        self.failures.pop(guild_id, None)
+        self.schedule_save(SubscriptionStore.set_record(guild_id, self.guilds[guild_id]))
+        self._changed(guild_id)
+
+    def preferences(self, guild_id):
+        """Return a guild's notification preferences as a dict, empty when it uses the defaults."""
+        return _preferences(self.guilds.get(str(guild_id)))
+
+    def set_preferences(self, guild_id, **preferences):
+        """Update a guild's notification preferences.
+
+        event_types is a list of event types to receive, quiet_hours a
+        [start, end) pair of local hours without notifications, and timezone
+        the name of the timezone times are shown and quiet hours counted in.
+        A value of None resets that preference to the default.
+        """
+        guild_id = str(guild_id)
+        info = self.guilds.get(guild_id)
+        if info is None:
+            return False
+        info = dict(info)
+        for key, value in preferences.items():
+            if key not in PREFERENCE_KEYS:
+                raise ValueError(f"Unknown preference: {key}")
+            if value is None:
+                info.pop(key, None)
+            else:
+                info[key] = value
+        self.guilds[guild_id] = info
+        self.schedule_save(SubscriptionStore.set_record(guild_id, info))
+        self._changed(guild_id)
+        return True
+
+    def disable_channel(self, guild_id, reason):
+        """Stop delivering to a guild's channel, keeping a note of it and why.
+
+        The guild then counts as unconfigured, so the reminder task asks its
+        owner to set a new channel.
+        """
+        guild_id = str(guild_id)
+        info = self.guilds.get(guild_id)
+        if info is None or "channel_id" not in info:
+            return
+        info = dict(info)
+        info["disabled_channel_id"] = info.pop("channel_id")
+        info["disabled_reason"] = reason
+        info.pop("webhook_id", None)
+        info.pop("webhook_token", None)
+        self.guilds[guild_id] = info
+        self.webhooks.pop(self.subscriptions.pop(guild_id, None), None)
+        self.failures.pop(guild_id, None)
+        self.schedule_save(SubscriptionStore.set_record(guild_id, info))
+        self._changed(guild_id)
+        if self.on_disable is not None:
+            self.on_disable(guild_id)
+
+    def forget_webhook(self, channel_id):
+        """Stop using a channel's webhook (e.g. it was deleted), messages then go out with the bot token."""
+        if self.webhooks.pop(channel_id, None) is None:
+            return
+        # Rare, so a scan beats keeping a channel -> guild map up to date
+        for guild_id, subscribed_channel in self.subscriptions.items():
+            if subscribed_channel == channel_id:
+                info = dict(self.guilds[guild_id])
+                info.pop("webhook_id", None)
+                info.pop("webhook_token", None)
+                self.guilds[guild_id] = info
+                self.schedule_save(SubscriptionStore.set_record(guild_id, info))
+                log.warning("Webhook of channel %s in %s is gone, sending with the bot token instead.", channel_id, self.server_name(guild_id))
+                return
+
+    def record_delivery(self, guild_id, channel_id, error=None):
+        """Track consecutive delivery failures and disable the channel past the limit.
+
+        Called by the delivery queue after each delivery that succeeded
+        (error is None) or failed permanently.
+        """
+        guild_id = str(guild_id)
+        if self.subscriptions.get(guild_id) != channel_id:
+            return  # The guild changed or lost its channel since the message was queued
+        if error is None:
+            if self.failures:
+                self.failures.pop(guild_id, None)
+            return
+
+        failures = self.failures[guild_id] = self.failures.get(guild_id, 0) + 1
+        if failures >= self.failure_limit:
+            self.disable_channel(guild_id, f"{failures} failed deliveries, last error: {error}")
+            log.warning("Disabled channel %s of %s (ID: %s) after %d failed deliveries: %s",
+                        channel_id, self.server_name(guild_id), guild_id, failures, error)
+
+    def remove_guild(self, guild_id):
+        """Forget a guild. Returns False if it was not known."""
+        guild_id = str(guild_id)
+        if guild_id not in self.guilds:
+            return False
+        del self.guilds[guild_id]
+        self.webhooks.pop(self.subscriptions.pop(guild_id, None), None)
+        self.schedule_save(SubscriptionStore.delete_record(guild_id))
+        self._changed(guild_id)
+        return True
+
+    def _changed(self, guild_id):
+        if self.on_change is not None:
+            self.on_change(guild_id)
+
+    def schedule_save(self, record):
+        """Queue a change record for the journal, coalescing writes that happen close together."""
+        if self.read_only:
+            return
+        self._pending.append(record)
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.get_running_loop().create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(self.save_delay)
+        # Once started, a write must finish even if flush() cancels this task
+        await asyncio.shield(self._write())
+
+    async def _write(self):
+        async with self._write_lock:
+            records, self._pending = self._pending, []
+            await asyncio.to_thread(self.store.append, records)
+
+            if self.store.journal_entries >= self.compact_after:
+                # Changes made from here on stay in self._pending until the next write
+                snapshot = json.dumps(self.guilds, indent=4, ensure_ascii=False)
+                await asyncio.to_thread(self.store.compact, snapshot)
+
+    async def flush(self):
+        """Write any pending changes immediately."""
+        if self._save_task is not None and not self._save_task.done():
+            self._save_task.cancel()
+        self._save_task = None
+        await self._write()
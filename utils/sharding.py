@@ -0,0 +1,45 @@
+import os
+
+
+def shard_options():
+    """Read the sharding settings from the environment.
+
+    SHARD_COUNT and SHARD_IDS (comma separated) pin this process to a range of
+    shards so several processes can split the guilds between them. SHARDED=1
+    alone lets Discord pick the shard count and runs every shard in this process.
+    Returns None when the bot should run unsharded.
+    """
+    shard_count = os.getenv("SHARD_COUNT")
+    shard_ids = os.getenv("SHARD_IDS")
+    if not (shard_count or shard_ids or os.getenv("SHARDED")):
+        return None
+
+    options = {}
+    if shard_count:
+        options["shard_count"] = int(shard_count)
+    if shard_ids:
+        options["shard_ids"] = [int(shard_id) for shard_id in shard_ids.split(",")]
+    return options
+
+
+def shard_path(path):
+    """Return a default file path that is unique to this process's shards.
+
+    With SHARD_IDS set, several processes run side by side and must not share
+    state files, so the shard ids are added before the extension, e.g.
+    delivery_queue.journal becomes delivery_queue_shards_0_1.journal.
+    """
+    shard_ids = os.getenv("SHARD_IDS")
+    if not shard_ids:
+        return path
+    root, extension = os.path.splitext(path)
+    suffix = "_".join(shard_id.strip() for shard_id in shard_ids.split(","))
+    return f"{root}_shards_{suffix}{extension}"
+
+
+def owns_guild(bot, guild_id):
+    """Return True if the guild is served by one of this process's shards."""
+    shard_ids = getattr(bot, "shard_ids", None)
+    if not shard_ids or not bot.shard_count:
+        return True
+    return (int(guild_id) >> 22) % bot.shard_count in shard_ids
@@ -0,0 +1,368 @@
+import asyncio
+import contextlib
+import json
+import logging
+import time
+
+import aiohttp
+
+from utils import metrics
+from utils.backoff import Backoff
+from utils.dedupe import EventDeduplicator
+from utils.delivery import LatencyTracker
+
+log = logging.getLogger(__name__)
+
+MIN_RETRY = 0.5  # Lowest reconnection base delay a server can ask for, in seconds
+
+
+class SSEEvent:
+    """A single dispatched server-sent event."""
+
+    __slots__ = ("event", "data", "id")
+
+    def __init__(self, event, data, id):
+        self.event = event  # The "event:" field, "message" when absent
+        self.data = data  # All "data:" lines joined with newlines
+        self.id = id  # Last event id seen so far on the stream, or None
+
+    def __repr__(self):
+        return f"SSEEvent(event={self.event!r}, id={self.id!r}, data={self.data!r})"
+
+
+class SSEDecoder:
+    """Incremental decoder for a text/event-stream body.
+
+    Feed it raw chunks as they arrive from the network; it returns the events
+    completed by each chunk. Partial lines stay in the buffer until the rest
+    arrives, and the consumed prefix is dropped once per chunk. Supports
+    multi-line data, comments, and the id and retry fields.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.last_event_id = None  # Sent back as Last-Event-ID when reconnecting
+        self.retry = None  # Reconnection delay requested by the server, in seconds
+        self._event = None
+        self._data = []
+
+    def reset(self):
+        """Drop any partially received event, keeping last_event_id and retry for the next connection."""
+        self.buffer.clear()
+        self._event = None
+        self._data = []
+
+    def feed(self, chunk):
+        """Add a chunk of bytes and return the list of completed SSEEvents."""
+        buffer = self.buffer
+        buffer += chunk
+        events = []
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end == -1:
+                break
+            line_end = end - 1 if end > start and buffer[end - 1] == 0x0D else end  # Strip \r of \r\n
+            if line_end == start:
+                event = self._dispatch()
+                if event is not None:
+                    events.append(event)
+            else:
+                self._field(buffer[start:line_end].decode("utf-8", errors="replace"))
+            start = end + 1
+        if start:
+            del buffer[:start]
+        return events
+
+    def _field(self, line):
+        if line[0] == ":":
+            return  # Comment, used by servers as a keep-alive
+        name, _, value = line.partition(":")
+        if value[:1] == " ":
+            value = value[1:]
+
+        if name == "data":
+            self._data.append(value)
+        elif name == "event":
+            self._event = value
+        elif name == "id":
+            if "\0" not in value:
+                self.last_event_id = value
+        elif name == "retry":
+            if value.isdigit():
+                self.retry = int(value) / 1000
+
+    def _dispatch(self):
+        data, event = self._data, self._event
+        self._data = []
+        self._event = None
+        if not data:
+            return None
+        return SSEEvent(event or "message", "\n".join(data), self.last_event_id)
+
+
+class StreamWatchdog:
+    """Track the liveness of an SSE connection.
+
+    A connection counts as stalled when no bytes arrived for `read_timeout`
+    seconds, or no heartbeat arrived for `heartbeat_timeout` seconds (0
+    disables the heartbeat check). A half-open TCP connection looks exactly
+    like a quiet stream, so this is the only way to notice it.
+    """
+
+    def __init__(self, read_timeout=60.0, heartbeat_timeout=0):
+        self.read_timeout = read_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        self.connected = False
+        self.connected_at = None
+        self.last_byte_at = None
+        self.last_heartbeat_at = None
+        self.last_event_at = None
+        self.connects = 0
+        self.stalls = 0
+
+    def on_connect(self):
+        now = time.monotonic()
+        self.connected = True
+        self.connected_at = self.last_byte_at = self.last_heartbeat_at = now
+        self.connects += 1
+        if self.connects > 1:
+            metrics.sse_reconnects.inc()
+
+    def on_disconnect(self):
+        self.connected = False
+
+    def on_bytes(self):
+        self.last_byte_at = time.monotonic()
+
+    def on_heartbeat(self):
+        self.last_heartbeat_at = time.monotonic()
+
+    def on_event(self):
+        self.last_event_at = time.monotonic()
+
+    def time_left(self):
+        """Seconds until the connection counts as stalled."""
+        deadline = self.last_byte_at + self.read_timeout
+        if self.heartbeat_timeout:
+            deadline = min(deadline, self.last_heartbeat_at + self.heartbeat_timeout)
+        return deadline - time.monotonic()
+
+    def health(self):
+        """Return a dict describing the connection, for logs and metrics."""
+        now = time.monotonic()
+
+        def age(timestamp):
+            return None if timestamp is None else round(now - timestamp, 3)
+
+        return {
+            "connected": self.connected,
+            "connected_for": age(self.connected_at) if self.connected else None,
+            "since_last_byte": age(self.last_byte_at),
+            "since_last_heartbeat": age(self.last_heartbeat_at),
+            "since_last_event": age(self.last_event_at),
+            "reconnects": max(0, self.connects - 1),
+            "stalls": self.stalls,
+        }
+
+
+class SSEClient:
+    """Keep a server-sent events connection open and yield its events as parsed JSON.
+
+    Reconnects with jittered exponential backoff, resumes with Last-Event-ID,
+    and forces a reconnect when the watchdog sees the stream go quiet.
+    Heartbeat events feed the watchdog and are not yielded.
+    """
+
+    def __init__(self, session, url, read_timeout=60.0, heartbeat_timeout=0):
+        self.session = session
+        self.url = url
+        self.decoder = SSEDecoder()
+        self.backoff = Backoff()
+        self.watchdog = StreamWatchdog(read_timeout, heartbeat_timeout)
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=10)  # The stream never "completes"
+
+    async def events(self):
+        """Yield events forever, reconnecting whenever the stream ends, fails or stalls."""
+        while True:
+            try:
+                async for event in self._connect():
+                    yield event
+            except Exception as e:
+                log.warning("Error in SSE connection to %s: %s", self.url, e)
+            finally:
+                self.watchdog.on_disconnect()
+
+            # Wait before retrying, honouring the server's retry: field as the base delay,
+            # but never below MIN_RETRY so "retry: 0" can't turn into a tight reconnect loop
+            if self.decoder.retry is not None:
+                self.backoff.base = max(MIN_RETRY, self.decoder.retry)
+            await asyncio.sleep(self.backoff.next())
+
+    async def _connect(self):
+        decoder = self.decoder
+        watchdog = self.watchdog
+        headers = {"Accept": "text/event-stream"}
+        # Ask the API to replay anything we missed while disconnected
+        if decoder.last_event_id is not None:
+            headers["Last-Event-ID"] = decoder.last_event_id
+
+        async with self.session.get(self.url, headers=headers, timeout=self.timeout) as response:
+            if response.status != 200:
+                log.warning("Failed to connect to SSE stream %s: %s", self.url, response.status)
+                return
+            log.info("Connected to SSE stream %s.", self.url)
+            self.backoff.reset()
+            watchdog.on_connect()
+            decoder.reset()  # Drop any partial event from the previous connection
+
+            while True:
+                try:
+                    # Allow at least a second so data buffered while we were busy is still read
+                    chunk = await asyncio.wait_for(response.content.readany(), timeout=max(1.0, watchdog.time_left()))
+                except asyncio.TimeoutError:
+                    watchdog.stalls += 1
+                    metrics.sse_stalls.inc()
+                    log.warning("SSE stream %s stalled, reconnecting.", self.url, extra={"fields": watchdog.health()})
+                    return
+                if not chunk:
+                    log.info("SSE stream %s closed by the server.", self.url)
+                    return
+                watchdog.on_bytes()
+
+                for sse_event in decoder.feed(chunk):
+                    # Parse the event data as JSON
+                    try:
+                        event = json.loads(sse_event.data)
+                    except json.JSONDecodeError:
+                        log.warning("Failed to decode event data: %s", sse_event.data)
+                        continue
+                    if event.get("event") == "heartbeat":
+                        watchdog.on_heartbeat()
+                        continue
+                    watchdog.on_event()
+                    yield event
+
+
+class MultiSourceSSE:
+    """Read the same event stream from several endpoints at once and merge them.
+
+    Every source is connected at the same time (hedging), and an event is
+    yielded as soon as the first source delivers it; copies from the other
+    sources are dropped. For each copy, the delay behind the first source is
+    recorded, and a source whose median delay over its last `demote_after`
+    events exceeds `demote_lag` seconds is disconnected for `demote_cooldown`
+    seconds, as long as another source is connected. If every other source
+    drops meanwhile, the demotion ends early. After the cooldown the source
+    reconnects and is measured again. With a single source this behaves like
+    a plain SSEClient.
+    """
+
+    def __init__(self, session, urls, read_timeout=60.0, heartbeat_timeout=0,
+                 demote_lag=2.0, demote_after=20, demote_cooldown=300.0):
+        self.clients = [SSEClient(session, url, read_timeout, heartbeat_timeout) for url in urls]
+        self.demote_lag = demote_lag  # 0 never demotes
+        self.demote_after = demote_after
+        self.demote_cooldown = demote_cooldown
+        self.rejoin_check = 1.0  # Seconds between checks that a demoted source is still dispensable
+        self.lag = {client: LatencyTracker(demote_after) for client in self.clients}  # Delay behind the first source
+        self.first = {client: 0 for client in self.clients}  # Events this source delivered first
+        self.demoted_until = {}  # client -> time.monotonic() its cooldown ends
+        self.readers = {}  # client -> task reading it, or waiting out its demotion
+        self.queue = None  # Events from every source, as (client, event, arrival time)
+        # Events seen in the last hour, mapped to when the first copy arrived
+        self.dedupe = EventDeduplicator(max_size=4096, ttl=3600.0)
+
+    @property
+    def connected(self):
+        return any(client.watchdog.connected for client in self.clients)
+
+    @staticmethod
+    def event_key(event):
+        if "time" in event:
+            return event.get("event"), event.get("type"), event["time"]
+        return json.dumps(event, sort_keys=True)
+
+    async def events(self):
+        """Yield each event once, from whichever source delivers it first."""
+        queue = self.queue = asyncio.Queue()
+        self.readers = {client: asyncio.create_task(self._read(client)) for client in self.clients}
+        try:
+            while True:
+                client, event, arrived = await queue.get()
+                key = self.event_key(event)
+                if self.dedupe.check(key):
+                    self._record_lag(client, arrived - self.dedupe.seen[key])
+                    continue
+                self.first[client] += 1
+                self._record_lag(client, 0.0)
+                yield event
+        finally:
+            tasks = list(self.readers.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)  # Let every connection close
+
+    async def _read(self, client):
+        """Feed a source's events into the merge queue until the task is cancelled."""
+        # Cancelling the task closes the generator, and with it the connection
+        async with contextlib.aclosing(client.events()) as events:
+            async for event in events:
+                self.queue.put_nowait((client, event, time.monotonic()))
+
+    async def _rejoin(self, client):
+        """Wait out a source's demotion, then read it again.
+
+        The demotion ends early when no other source is connected any more,
+        a slow source beats none.
+        """
+        while any(other.watchdog.connected for other in self.clients if other is not client):
+            cooldown = self.demoted_until[client] - time.monotonic()
+            if cooldown <= 0:
+                log.info("SSE source %s reconnecting after its demotion.", client.url)
+                break
+            await asyncio.sleep(min(cooldown, self.rejoin_check))
+        else:
+            log.warning("No other SSE source connected, ending the demotion of %s early.", client.url)
+        del self.demoted_until[client]
+        self.lag[client].samples.clear()
+        await self._read(client)
+
+    def _record_lag(self, client, lag):
+        tracker = self.lag[client]
+        tracker.record(lag)
+        if not self.demote_lag or len(tracker.samples) < self.demote_after or client in self.demoted_until:
+            return
+        median = tracker.percentile(50)
+        others = [
+            other for other in self.clients
+            if other is not client and other not in self.demoted_until and other.watchdog.connected
+        ]
+        if median > self.demote_lag and others:
+            self.demoted_until[client] = time.monotonic() + self.demote_cooldown
+            # Disconnect right away rather than at the source's next event, which may never come
+            self.readers[client].cancel()
+            self.readers[client] = asyncio.create_task(self._rejoin(client))
+            metrics.sse_demotions.inc()
+            log.warning("Demoting SSE source %s for %.0fs, it trails the fastest source by %.2fs.",
+                        client.url, self.demote_cooldown, median)
+
+    def health(self):
+        """Return the merged connection health with a breakdown per source."""
+        sources = []
+        for client in self.clients:
+            lag = self.lag[client]
+            sources.append({
+                "url": client.url,
+                **client.watchdog.health(),
+                "first": self.first[client],
+                "lag_p50": lag.percentile(50),
+                "lag_p99": lag.percentile(99),
+                "demoted": client in self.demoted_until,
+            })
+        since_last_byte = [source["since_last_byte"] for source in sources if source["connected"]]
+        return {
+            "connected": self.connected,
+            "since_last_byte": min(since_last_byte) if since_last_byte else None,
+            "sources": sources,
+        }
@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class SubscriptionStore:
+    """Crash-safe storage for the channels database.
+
+    The database lives in two files: a snapshot (channels.json, same format as
+    before) and an append-only journal next to it holding one JSON line per
+    guild change. Loading replays the journal over the snapshot. Compaction
+    writes a fresh snapshot to a temporary file, atomically swaps it in with
+    os.replace and empties the journal. Replaying a change twice is harmless,
+    so a crash at any point leaves a readable database behind.
+
+    An existing channels.json needs no conversion: it becomes the first
+    snapshot and the journal is created on the first change.
+    """
+
+    def __init__(self, path="channels.json", journal_path=None):
+        self.path = path
+        self.journal_path = journal_path or f"{path}.journal"
+        self.journal_entries = 0  # Changes written since the last compaction
+        self.lock = threading.Lock()  # Appends and compactions may run in worker threads
+
+    def load(self):
+        """Return the database as a dict of guild_id -> info."""
+        data = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+        self.journal_entries = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash mid-append leaves a partial last line, skip it
+                        log.warning("Skipping damaged journal entry in %s", self.journal_path)
+                        continue
+                    self._apply(data, record)
+                    self.journal_entries += 1
+        return data
+
+    @staticmethod
+    def _apply(data, record):
+        if record["op"] == "set":
+            data[record["guild_id"]] = record["info"]
+        elif record["op"] == "del":
+            data.pop(record["guild_id"], None)
+
+    @staticmethod
+    def set_record(guild_id, info):
+        return {"op": "set", "guild_id": guild_id, "info": dict(info)}
+
+    @staticmethod
+    def delete_record(guild_id):
+        return {"op": "del", "guild_id": guild_id}
+
+    def append(self, records):
+        """Durably append a batch of change records to the journal."""
+        if not records:
+            return
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with self.lock:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_entries += len(records)
+
+    def compact(self, snapshot):
+        """Atomically replace the snapshot with `snapshot` (a JSON string) and empty the journal."""
+        tmp_path = f"{self.path}.tmp"
+        with self.lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(snapshot)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            # Every journaled change is now part of the snapshot
+            with open(self.journal_path, "w", encoding="utf-8") as f:
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_entries = 0
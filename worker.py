@@ -0,0 +1,47 @@
+"""Stateless delivery worker for Pépito events.
+
+Receives events from the gateway bot over the event relay and delivers them,
+through channel webhooks with DELIVERY_MODE=webhook. It logs in to Discord's
+REST API only: no gateway session, no guild or channel cache. The channels
+database is read from the gateway bot's files and re-read every
+WORKER_RELOAD_INTERVAL seconds, but never written: delivery results and
+deleted webhooks are sent back over the relay for the gateway bot to record.
+
+Run the gateway bot with EVENT_IPC_ROLE=publisher and EVENT_DELIVERY=worker,
+then start one worker next to it:
+
+    DELIVERY_MODE=webhook python worker.py
+"""
+import asyncio
+import logging
+import os
+
+# The worker always receives events from the relay and delivers them itself,
+# whatever the gateway bot's .env says
+os.environ["EVENT_IPC_ROLE"] = "subscriber"
+os.environ["EVENT_DELIVERY"] = "local"
+os.environ.setdefault("DELIVERY_QUEUE_DB", "worker_delivery_queue.journal")
+os.environ.setdefault("DEAD_LETTERS_DB", "worker_dead_letters.jsonl")
+
+from bot import TOKEN, create_bot
+from utils.logs import setup_logging
+
+log = logging.getLogger("worker")
+
+
+async def main():
+    setup_logging()
+    bot = create_bot(delivery_only=True)
+    reload_interval = float(os.getenv("WORKER_RELOAD_INTERVAL", "30"))
+    async with bot:
+        await bot.login(TOKEN)  # REST only, runs setup_hook which loads the delivery cogs
+        log.info("Delivery worker running for %d channels (%d with a webhook).",
+                 len(bot.registry.subscriptions), len(bot.registry.webhooks))
+        while True:
+            await asyncio.sleep(reload_interval)
+            # Pick up channels set or removed through the gateway bot
+            bot.registry.load()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())